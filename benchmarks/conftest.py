@@ -0,0 +1,121 @@
+"""Synthetic, realistically shaped StatBank payloads for the benchmarks.
+
+Payload sizes are set with environment variables, so that the same suite
+runs quickly in review and at full scale on a benchmark machine:
+
+DENSTATBANK_BENCH_CELLS
+    Comma separated numbers of data cells, default '1000,100000,1000000'.
+    1e7 cells is a JSON-stat body of roughly 100 MB.
+DENSTATBANK_BENCH_VALUES
+    Comma separated numbers of variable values in tableinfo responses,
+    default '1000,100000'.
+DENSTATBANK_BENCH_TABLES
+    Number of tables in tables() and subjects() responses, default 2000.
+"""
+import json
+import os
+import tracemalloc
+import numpy as np
+import pytest
+
+
+def env_sizes(name, default):
+    return [int(float(n)) for n in os.environ.get(name, default).split(',')]
+
+
+CELLS = env_sizes('DENSTATBANK_BENCH_CELLS', '1000,100000,1000000')
+VALUES = env_sizes('DENSTATBANK_BENCH_VALUES', '1000,100000')
+TABLES = env_sizes('DENSTATBANK_BENCH_TABLES', '2000')[0]
+
+# Dimensions of a FOLK1A like table, the last one is repeated as needed.
+DIMENSIONS = [('OMRÅDE', 99), ('KØN', 2), ('ALDER', 126), ('CIVILSTAND', 4),
+              ('Tid', None)]
+
+
+def dataset(cells, seed=0):
+    """JSON-stat data response with about the given number of cells."""
+    sizes, n = [], 1
+    for code, size in DIMENSIONS:
+        if size is None or n * size > cells:
+            size = max(1, cells // n)
+            sizes.append((code, size))
+            n *= size
+            break
+        sizes.append((code, size))
+        n *= size
+    dimension = {}
+    for code, size in sizes:
+        ids = [f'{code[:1]}{i}' for i in range(size)]
+        dimension[code] = {'label': code.lower(),
+                           'category': {'index': {x: i for i, x in enumerate(ids)},
+                                        'label': {x: f'{code} {x}' for x in ids}}}
+    dimension['id'] = [code for code, _ in sizes]
+    dimension['size'] = [size for _, size in sizes]
+    dimension['role'] = {'time': ['Tid']}
+    values = np.random.default_rng(seed).integers(0, 100000, n).tolist()
+    return {'dataset': {'dimension': dimension, 'label': 'Synthetic table',
+                        'source': 'Statistics Denmark',
+                        'updated': '2020-02-11T07:00:00Z', 'value': values}}
+
+
+def tableinfo(values):
+    """tableinfo response whose variables have values in total."""
+    variables = []
+    per_variable = max(1, values // 4)
+    for v in range(4):
+        variables.append({'id': f'VAR{v}', 'text': f'variable {v}',
+                          'elimination': True, 'time': False,
+                          'values': [{'id': str(i), 'text': f'value {i} of {v}'}
+                                     for i in range(per_variable)]})
+    return {'id': 'SYNTH', 'text': 'Synthetic table', 'updated': '2020-02-11T08:00:00',
+            'variables': variables}
+
+
+def tables(n):
+    """tables() response with n tables."""
+    return [{'id': f'TAB{i}', 'text': f'Table number {i} by region and time',
+             'unit': 'number', 'updated': '2020-02-11T08:00:00',
+             'firstPeriod': '2008K1', 'latestPeriod': '2020K1', 'active': True,
+             'variables': ['region', 'sex', 'age', 'time']} for i in range(n)]
+
+
+def subjects(n_tables, breadth=6, depth=4):
+    """Recursive subjects() response with n_tables spread over the leaves."""
+    counter = iter(range(10 ** 9))
+    leaves = []
+
+    def node(level):
+        d = {'id': str(next(counter)), 'description': f'Subject at level {level}',
+             'active': True, 'hasSubjects': level < depth, 'subjects': [],
+             'tables': []}
+        if level < depth:
+            d['subjects'] = [node(level + 1) for _ in range(breadth)]
+        else:
+            leaves.append(d)
+        return d
+    roots = [node(1) for _ in range(breadth)]
+    for i, t in enumerate(tables(n_tables)):
+        leaves[i % len(leaves)]['tables'].append({'id': t['id'], 'text': t['text']})
+    return roots
+
+
+def encode(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+def record(benchmark, fn, *args, size=None, unit='cells'):
+    """Benchmarks fn(*args) and records its peak traced memory and, if size
+    is given, its throughput in the benchmark extra info."""
+    tracemalloc.start()
+    fn(*args)
+    benchmark.extra_info['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    result = benchmark(fn, *args)
+    if size is not None and benchmark.stats is not None:
+        benchmark.extra_info[f'{unit}_per_s'] = size / benchmark.stats.stats.mean
+    return result
+
+
+@pytest.fixture(scope='session', params=CELLS, ids=lambda n: f'{n}cells')
+def data_payload(request):
+    return request.param, encode(dataset(request.param))
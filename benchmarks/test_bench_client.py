@@ -0,0 +1,62 @@
+"""Benchmarks of the client hot paths. Run with
+
+    pip install pytest-benchmark
+    pytest benchmarks --benchmark-columns=mean,stddev,ops
+
+and compare runs with --benchmark-autosave / --benchmark-compare.
+"""
+import json
+import pytest
+from denstatbank import StatBankClient
+from denstatbank.decoders import available_decoders, get_decoder
+from denstatbank.utils import data_dict_to_df, variables_to_df, subtabtree
+from tests.statbank_server import serve
+from .conftest import VALUES, TABLES, tableinfo, tables, subjects, record
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.parametrize('name', available_decoders())
+def test_decode(benchmark, data_payload, name):
+    cells, content = data_payload
+    decode = get_decoder(name)
+    benchmark.extra_info['mb'] = len(content) / 2 ** 20
+    record(benchmark, decode, content, True, size=cells)
+
+
+def test_data_dict_to_df(benchmark, data_payload):
+    cells, content = data_payload
+    ddict = json.loads(content)['dataset']
+    codes = [k.lower() for k in ddict['dimension']['id']]
+    df = record(benchmark, data_dict_to_df, ddict, codes, size=len(ddict['value']))
+    assert len(df) == len(ddict['value'])
+
+
+@pytest.mark.parametrize('values', VALUES, ids=lambda n: f'{n}values')
+def test_variables_to_df(benchmark, values):
+    varlist = tableinfo(values)['variables']
+    record(benchmark, variables_to_df, varlist, 'da', size=values, unit='values')
+
+
+def test_subtabtree(benchmark):
+    resp = subjects(TABLES)
+
+    def walk():
+        return sum(1 for d in resp for _ in subtabtree(d))
+    record(benchmark, walk, size=TABLES, unit='tables')
+
+
+def test_tables_end_to_end(benchmark):
+    body = json.dumps(tables(TABLES)).encode('utf-8')
+    with serve(lambda cat, params: body) as url:
+        client = StatBankClient(base_url=url)
+        record(benchmark, client.tables, size=TABLES, unit='tables')
+
+
+def test_data_end_to_end(benchmark, data_payload):
+    cells, content = data_payload
+    with serve(lambda cat, params: content) as url:
+        client = StatBankClient(base_url=url)
+        variables = [client.variable_dict(k, ['*']) for k in
+                     json.loads(content)['dataset']['dimension']['id']]
+        record(benchmark, client.data, 'SYNTH', True, variables, size=cells)
@@ -1,4 +1,8 @@
 from .denstatbank import StatBankClient
+from .exceptions import (StatBankError, StatBankRequestError,
+                         StatBankRateLimitError, StatBankServerError,
+                         StatBankTimeoutError, StatBankConnectionError,
+                         StatBankValidationError, StatBankCellLimitError)
 
 __name__ = "denstatbank"
 __version__ = "0.7.0"
@@ -0,0 +1,198 @@
+import asyncio
+from urllib.parse import quote
+from .utils import (data_dict_to_df, add_list_to_dict, subtabtree,
+                    expand_variables, split_variables, merge_datasets,
+                    variables_to_df, retry_delay, error_message)
+from .denstatbank import StatBankClient
+from .decoders import get_decoder
+from .exceptions import (request_error, StatBankTimeoutError,
+                         StatBankConnectionError)
+from .denstatbank import RETRY_STATUSES
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class AsyncStatBankClient:
+    """Asyncio client that connects to the Databank API of Statistics
+    Denmark. Requires the optional aiohttp dependency.
+
+    The public methods mirror those of StatBankClient and return the same
+    objects, but must be awaited. The client is best used as an async
+    context manager so that the underlying connection pool is closed.
+
+    Attributes
+    ----------
+    lang : str, {'da', 'en'} default is 'da'
+    max_concurrency : int, default is 10
+        Maximum number of requests in flight at the same time.
+    pool_size : int, default is 10
+        Maximum number of open connections in the connection pool.
+    decoder : str or callable, default is None
+        JSON decoder for the responses, see StatBankClient.
+    timeout, retries, backoff_factor, max_backoff
+        Timeout in seconds for each request and retry policy, see
+        StatBankClient. Errors are raised as in StatBankClient.
+    base_url : str, default is 'https://api.statbank.dk/v1/'
+        Root URL of the API.
+
+    Examples
+    --------
+    >>> async with AsyncStatBankClient(lang='en') as sbc:
+    ...     dfs = await asyncio.gather(*[sbc.data(t) for t in ['folk1a', 'bef5']])
+    """
+
+    def __init__(self, lang='da', max_concurrency=10, pool_size=10,
+                 session=None, decoder=None, timeout=60, retries=3,
+                 backoff_factor=0.5, max_backoff=30,
+                 base_url='https://api.statbank.dk/v1/'):
+        if aiohttp is None:
+            raise ImportError(
+                'AsyncStatBankClient requires aiohttp: pip install aiohttp')
+        self.lang = lang
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.session = session
+        self._base_url = base_url
+        self._semaphore = None
+        self._decode = get_decoder(decoder)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+    lang = StatBankClient.lang
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Closes the underlying aiohttp session."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _get_session(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def _base_request(self, cat, params, values_array=False):
+        """
+        Submits all POST request to API and returns response.
+        Used internally by all client facing methods.
+        Timeouts, connection errors and 429/5xx responses are retried with
+        exponential backoff.
+        """
+        params.update({'lang': self.lang})
+        session = self._get_session()
+        url = self._base_url+quote(cat)
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                async with self._semaphore:
+                    async with session.post(url, json=params) as resp:
+                        content = await resp.read()
+                        status, headers = resp.status, resp.headers
+            except asyncio.TimeoutError as ex:
+                if last:
+                    raise StatBankTimeoutError(str(ex)) from ex
+                delay = retry_delay(attempt, self.backoff_factor, self.max_backoff)
+            except aiohttp.ClientConnectionError as ex:
+                if last:
+                    raise StatBankConnectionError(str(ex)) from ex
+                delay = retry_delay(attempt, self.backoff_factor, self.max_backoff)
+            else:
+                if status == 200:
+                    return self._decode(content, values_array)
+                if last or status not in RETRY_STATUSES:
+                    raise request_error(status, error_message(content))
+                delay = retry_delay(attempt, self.backoff_factor, self.max_backoff,
+                                    headers.get('Retry-After'))
+            await asyncio.sleep(delay)
+
+    async def subjects(self, subjects=None, include_tables=False, recursive=False, as_tree=True):
+        """Retrieves the basic subject(s) information for which tables exist in
+        the StatBank database. See StatBankClient.subjects().
+        """
+        cat = 'subjects'
+        params = dict(includeTables=include_tables, recursive=recursive)
+        add_list_to_dict(params, subjects=subjects)
+        resp = await self._base_request(cat, params)
+        if resp is not None:
+            if not as_tree:
+                return resp
+            else:
+                for d in resp:
+                    for g in subtabtree(d):
+                        print(g)
+
+    async def tables(self, subjects=None, past_days=None, include_inactive=False, as_df=True):
+        """Retrieves the complete list of tables present currently in the
+        Statbank database. See StatBankClient.tables().
+        """
+        cat = 'tables'
+        params = dict(pastdays=past_days, includeinactive=include_inactive)
+        add_list_to_dict(params, subjects=subjects)
+        resp = await self._base_request(cat, params)
+        if as_df and resp is not None:
+            import pandas as pd
+            return pd.DataFrame(resp)
+        else:
+            return resp
+
+    async def tableinfo(self, table_id, variables_df=False):
+        """Retrieves table specific information from the StatBank database.
+        See StatBankClient.tableinfo().
+        """
+        cat = 'tableinfo'
+        params = dict(table=table_id)
+        resp = await self._base_request(cat, params)
+        if resp is not None:
+            if variables_df:
+                return variables_to_df(resp['variables'], params['lang'])
+            else:
+                return resp
+
+    async def data(self, table_id, as_df=True, variables=None, max_cells=None,
+                   parse_time=False, all_dims=False, **kwargs):
+        """Retrieves the data for a specific table from the StatBank
+        database. See StatBankClient.data().
+
+        Selections larger than max_cells are split and the parts are
+        requested concurrently, subject to the client concurrency limit.
+        """
+        cat = 'data'
+        params = dict(format='JSONSTAT', table=table_id)
+        add_list_to_dict(params, variables=variables)
+        params.update({k: v for k, v in kwargs.items() if k})
+        codes = [d['code'].lower() for d in variables] if variables else []
+        parts = None
+        if max_cells is not None and variables:
+            info = await self.tableinfo(table_id)
+            parts = split_variables(expand_variables(variables, info), max_cells)
+        if parts is not None and len(parts) > 1:
+            resps = await asyncio.gather(*[
+                self._base_request(cat, dict(params, variables=p)) for p in parts])
+            resp = {'dataset': merge_datasets([r['dataset'] for r in resps])}
+        else:
+            resp = await self._base_request(cat, params, values_array=as_df)
+        if as_df and resp is not None:
+            ddict = resp['dataset']
+            return data_dict_to_df(ddict, codes, all_dims=all_dims,
+                                   parse_time=parse_time)
+        else:
+            return resp
+
+    variable_dict = staticmethod(StatBankClient.variable_dict)
@@ -0,0 +1,179 @@
+class Aligner:
+    """Aligns and joins data() results of several tables on the dimensions
+    they share, e.g. OMRÅDE, KØN and Tid.
+
+    Labels are matched through their dimension codes rather than their
+    texts, so tables whose texts differ slightly still line up. Each
+    dimension has a code space that numbers its codes once, in tableinfo()
+    order for the tables registered with add_table(). The index levels of
+    a dataframe are mapped to these integers once per level and cached, and
+    rows are placed on the common grid with integer arithmetic only.
+
+    Dataframes must come from data() (or data_dict_to_df()), whose attrs
+    hold the code of each index label.
+
+    Attributes
+    ----------
+    client : StatBankClient, default is None
+        Used by add_table() to read the codes of a table.
+
+    Examples
+    --------
+    >>> aligner = Aligner(sbc)
+    >>> aligner.add_table('folk1a')
+    >>> pop = sbc.data('folk1a', variables=[omr, tid])
+    >>> inc = sbc.data('indkp101', variables=[omr, tid])
+    >>> df = aligner.join([pop, inc])
+    """
+
+    def __init__(self, client=None):
+        self.client = client
+        self._index = {}
+        self._labels = {}
+        self._level_cache = {}
+
+    def _key(self, dim, code, label):
+        """Integer key of a code in the code space of a dimension."""
+        index = self._index.setdefault(dim, {})
+        key = index.get(code)
+        if key is None:
+            key = index[code] = len(index)
+            self._labels.setdefault(dim, []).append(label)
+        return key
+
+    def add_table(self, table_id, lang=None):
+        """Registers the codes of all variables of a table, in tableinfo()
+        order and with the texts of the lookup of the client."""
+        lookup = self.client.lookup(table_id, lang)
+        for variable, texts in lookup.code_to_text.items():
+            for code, text in texts.items():
+                self._key(variable.lower(), code, text)
+
+    def level_keys(self, df, dim):
+        """Integer keys of the labels of an index level of df, in level
+        order."""
+        import numpy as np
+        level = df.index.levels[df.index.names.index(dim)]
+        mapping = (df.attrs.get('codes') or {}).get(dim) or {}
+        codes = tuple(mapping.get(label, label) for label in level)
+        cache_key = (dim, tuple(level), codes)
+        keys = self._level_cache.get(cache_key)
+        if keys is None:
+            keys = np.array([self._key(dim, c, label) for c, label in zip(codes, level)],
+                            dtype=np.int64)
+            self._level_cache[cache_key] = keys
+        return keys
+
+    def row_keys(self, df, dim):
+        """Integer keys of the rows of df along a dimension."""
+        index = df.index
+        return self.level_keys(df, dim)[index.codes[index.names.index(dim)]]
+
+    def align(self, dfs, on=None, how='inner'):
+        """Reindexes dataframes onto a common grid of the shared dimensions.
+
+        Parameters
+        ----------
+        dfs : list of pd.DataFrame
+            Results of data().
+        on : list of str, default is None
+            Index level names (lower case variable codes) to align on. By
+            default the levels found in every dataframe. Other levels must
+            hold a single value, they are dropped.
+        how : str, {'inner', 'outer'} default is 'inner'
+            Whether the grid holds the codes of each dimension present in
+            all dataframes or in any of them.
+
+        Returns
+        -------
+        list of pd.DataFrame with the same MultiIndex, cells missing from
+        a dataframe being NaN.
+        """
+        import numpy as np
+        import pandas as pd
+        if how not in ('inner', 'outer'):
+            raise ValueError(f"how must be 'inner' or 'outer', not {how!r}.")
+        if on is None:
+            on = [n for n in dfs[0].index.names
+                  if n is not None and all(n in df.index.names for df in dfs[1:])]
+        if not on:
+            raise ValueError('The dataframes share no index level to align on.')
+        for df in dfs:
+            absent = [dim for dim in on if dim not in df.index.names]
+            if absent:
+                raise ValueError(f'Levels {absent} are not in the index of {df.attrs.get("label")!r}.')
+            for n, name in enumerate(df.index.names):
+                if name not in on and len(np.unique(df.index.codes[n])) > 1:
+                    raise ValueError(
+                        f'Level {name!r} is not aligned on and has several values; '
+                        f'select a single value or add it to on.')
+        rows = [{dim: self.row_keys(df, dim) for dim in on} for df in dfs]
+        grid = []
+        for dim in on:
+            present = [np.unique(r[dim]) for r in rows]
+            combine = np.intersect1d if how == 'inner' else np.union1d
+            keys = present[0]
+            for p in present[1:]:
+                keys = combine(keys, p)
+            grid.append(keys)
+        sizes = [len(keys) for keys in grid]
+        n = int(np.prod(sizes, dtype=np.int64))
+        levels, level_codes, label_codes = [], [], {}
+        for i, (dim, keys) in enumerate(zip(on, grid)):
+            codes = list(self._index[dim])
+            labels = [self._labels[dim][k] for k in keys]
+            level = pd.Index(labels)
+            if not level.is_unique:
+                labels = [codes[k] for k in keys]
+                level = pd.Index(labels)
+            levels.append(level)
+            inner = int(np.prod(sizes[i + 1:], dtype=np.int64))
+            outer = int(np.prod(sizes[:i], dtype=np.int64))
+            level_codes.append(np.tile(np.repeat(np.arange(sizes[i]), inner), outer))
+            label_codes[dim] = {label: codes[k] for label, k in zip(labels, keys)}
+        index = pd.MultiIndex(levels=levels, codes=level_codes, names=list(on),
+                              verify_integrity=False)
+        aligned = []
+        for df, r in zip(dfs, rows):
+            position = np.zeros(len(df), dtype=np.int64)
+            valid = np.ones(len(df), dtype=bool)
+            for dim, keys, size in zip(on, grid, sizes):
+                rank = np.full(len(self._index[dim]), -1, dtype=np.int64)
+                rank[keys] = np.arange(size)
+                pos = rank[r[dim]]
+                valid &= pos >= 0
+                position = position * size + pos
+            position = position[valid]
+            columns = {}
+            for col in df.columns:
+                values = df[col].to_numpy()
+                if values.dtype.kind in 'fiub':
+                    out = np.full(n, np.nan)
+                else:
+                    out = np.full(n, None, dtype=object)
+                out[position] = values[valid]
+                columns[col] = out
+            result = pd.DataFrame(columns, index=index)
+            result.attrs = dict(df.attrs, codes=label_codes)
+            aligned.append(result)
+        return aligned
+
+    def join(self, dfs, on=None, how='inner'):
+        """Aligns dataframes with align() and joins their columns into a
+        single dataframe. Columns with the same name are numbered."""
+        import pandas as pd
+        aligned = self.align(dfs, on=on, how=how)
+        seen = {}
+        for df in aligned:
+            renamed = {}
+            for col in df.columns:
+                if col in seen:
+                    seen[col] += 1
+                    renamed[col] = f'{col} ({seen[col]})'
+                else:
+                    seen[col] = 1
+            df.rename(columns=renamed, inplace=True)
+        joined = pd.concat(aligned, axis=1)
+        joined.attrs = {'codes': aligned[0].attrs['codes'],
+                        'labels': [df.attrs.get('label') for df in dfs]}
+        return joined
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Default time to live in seconds of the in-memory responses per endpoint.
+RESPONSE_TTLS = {'subjects': 3600, 'tables': 300, 'tableinfo': 3600,
+                 'data': 600}
+
+
+class MetadataCache:
+    """Persistent cache of tableinfo() and subjects() responses stored in a
+    SQLite database. It also holds the results of
+    StatBankClient.data_incremental().
+
+    Entries are stored per kind ('tableinfo' or 'subjects'), key (table id
+    or request parameters) and language. They are validated against the
+    tables updated in the last few days with refresh(), so that a single
+    tables(past_days=N) request is enough to find the stale entries.
+
+    Attributes
+    ----------
+    path : str or path-like
+        Location of the SQLite database file. Created, with its parent
+        directories, if it does not exist. A directory may be given,
+        including a path without a file suffix, in which case the file
+        'metadata.sqlite' inside it is used.
+
+    Examples
+    --------
+    >>> sbc = StatBankClient(cache='~/.cache/denstatbank')
+    >>> info = sbc.tableinfo('folk1a')   # fetched and stored
+    >>> info = sbc.tableinfo('folk1a')   # served from the cache
+    >>> sbc.refresh_cache(past_days=2)   # drops entries of updated tables
+    """
+
+    def __init__(self, path):
+        path = os.path.expanduser(os.fspath(path))
+        if path != ':memory:':
+            if os.path.isdir(path) or not os.path.splitext(path)[1]:
+                path = os.path.join(path, 'metadata.sqlite')
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'kind TEXT, key TEXT, lang TEXT, updated TEXT, checked REAL, '
+                'payload TEXT, PRIMARY KEY (kind, key, lang))')
+
+    def get(self, kind, key, lang):
+        """Returns the cached response or None."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload FROM entries WHERE kind=? AND key=? AND lang=?',
+                (kind, key, lang)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+    def put(self, kind, key, lang, payload, updated=None):
+        """Stores a response together with the table 'updated' timestamp."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, key, lang, updated, time.time(), json.dumps(payload)))
+
+    def invalidate(self, kind=None, key=None):
+        """Removes the entries matching kind and key, or all entries."""
+        query, args = 'DELETE FROM entries WHERE 1=1', []
+        if kind is not None:
+            query, args = query + ' AND kind=?', args + [kind]
+        if key is not None:
+            query, args = query + ' AND key=?', args + [key]
+        with self._lock, self._conn:
+            self._conn.execute(query, args)
+
+    def refresh(self, tables, past_days):
+        """Drops the entries that are stale according to a tables() response.
+
+        Parameters
+        ----------
+        tables : list of dicts
+            Response of tables(past_days=past_days, as_df=False).
+        past_days : int
+            The window covered by the tables response. Entries that were
+            last checked before the window cannot be validated and are
+            dropped as well.
+
+        Returns
+        -------
+        int, the number of entries removed.
+        """
+        now = time.time()
+        cutoff = now - past_days * 86400
+        updated = {t['id'].upper(): t['updated'] for t in tables}
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                'SELECT kind, key, lang, updated, checked FROM entries').fetchall()
+            stale = []
+            for kind, key, lang, entry_updated, checked in rows:
+                if kind == 'data':
+                    # stored data results are validated when they are used
+                    continue
+                if checked < cutoff:
+                    stale.append((kind, key, lang))
+                elif kind == 'tableinfo' and key in updated:
+                    if updated[key] != entry_updated:
+                        stale.append((kind, key, lang))
+                elif kind == 'subjects' and updated:
+                    if json.loads(key).get('includeTables'):
+                        stale.append((kind, key, lang))
+            self._conn.executemany(
+                'DELETE FROM entries WHERE kind=? AND key=? AND lang=?', stale)
+            self._conn.execute('UPDATE entries SET checked=?', (now,))
+        return len(stale)
+
+    def close(self):
+        self._conn.close()
+
+
+class _Flight:
+    """A request in progress that identical requests wait for."""
+
+    __slots__ = ('done', 'content', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.content = None
+        self.error = None
+
+
+class ResponseCache:
+    """In-memory LRU cache of raw response bodies with a time to live per
+    endpoint.
+
+    Responses are keyed on a hash of the endpoint and the request
+    parameters (including the language), with the variables of a data
+    request ordered by code and the table id upper cased, so that
+    identical selections share an entry. The cache holds the undecoded
+    bytes, so every hit is decoded into new objects which callers are free
+    to modify. Concurrent identical requests are sent once: the other
+    callers wait for the response of the first one.
+
+    Attributes
+    ----------
+    max_bytes : int, default is 64 MiB
+        Upper bound of the total size of the cached bodies. The least
+        recently used entries are evicted first.
+    ttl : dict, default is None
+        Time to live in seconds per endpoint, updating RESPONSE_TTLS. A ttl
+        of 0 disables caching for that endpoint.
+
+    Examples
+    --------
+    >>> sbc = StatBankClient(memory_cache=ResponseCache(ttl={'data': 60}))
+    >>> df = sbc.data('folk1a')   # fetched
+    >>> df = sbc.data('folk1a')   # decoded from memory
+    """
+
+    def __init__(self, max_bytes=64 << 20, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = dict(RESPONSE_TTLS, **(ttl or {}))
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(cat, params):
+        """Canonical hash of a request."""
+        params = dict(params)
+        if params.get('variables'):
+            params['variables'] = sorted(params['variables'],
+                                         key=lambda d: d['code'].lower())
+        if isinstance(params.get('table'), str):
+            params['table'] = params['table'].upper()
+        blob = json.dumps([cat, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the cached body or None if it is missing or expired."""
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, content = entry
+        if expires < time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return content
+
+    def put(self, key, cat, content):
+        """Stores a body for the ttl of the endpoint, evicting the least
+        recently used entries beyond max_bytes."""
+        ttl = self.ttl.get(cat, 0)
+        if not ttl or len(content) > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, content)
+            self.nbytes += len(content)
+            while self.nbytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= len(entry[1])
+
+    def fetch(self, cat, params, send):
+        """Returns the body of a request from the cache, from an identical
+        request in flight, or by calling send().
+
+        Returns
+        -------
+        tuple of the body (bytes) and whether it was served without
+        calling send().
+        """
+        key = self.key(cat, params)
+        with self._lock:
+            content = self._get(key)
+            if content is not None:
+                return content, True
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.content, True
+        try:
+            flight.content = send()
+            self.put(key, cat, flight.content)
+        except BaseException as ex:
+            flight.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+        return flight.content, False
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,62 @@
+import argparse
+import sys
+from .denstatbank import StatBankClient, MAX_CELLS
+
+
+def _mirror(args):
+    from .mirror import mirror, FORMATS
+    if args.format not in FORMATS:
+        raise SystemExit(f'Unknown format {args.format!r}.')
+    client = StatBankClient(lang=args.lang, rate_limit=args.rate_limit,
+                            retries=args.retries, base_url=args.base_url)
+
+    def progress(table_id, status, detail):
+        if status == 'failed':
+            print(f'{table_id}: failed ({detail})', file=sys.stderr)
+        elif not args.quiet:
+            print(f'{table_id}: {status}', file=sys.stderr)
+
+    result = mirror(client, args.path, tables=args.tables or None,
+                    include_inactive=args.include_inactive,
+                    max_workers=args.workers, fmt=args.format,
+                    max_cells=args.max_cells, progress=progress)
+    print(f"{len(result['fetched'])} fetched, {len(result['skipped'])} skipped, "
+          f"{len(result['failed'])} failed")
+    return 1 if result['failed'] else 0
+
+
+def main(argv=None):
+    """Entry point of the denstatbank command."""
+    parser = argparse.ArgumentParser(
+        prog='denstatbank',
+        description="Command line tools for Statistics Denmark's Databank API.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    sub = commands.add_parser(
+        'mirror', help='Mirror tables to a local directory.',
+        description='Downloads the metadata and data of StatBank tables to '
+                    'columnar files and a manifest. Interrupted runs resume, '
+                    'and tables that have not been updated are skipped.')
+    sub.add_argument('path', help='Directory of the mirror.')
+    sub.add_argument('--tables', nargs='*', metavar='ID',
+                     help='Table ids to mirror (all tables by default).')
+    sub.add_argument('--include-inactive', action='store_true',
+                     help='Mirror tables that are no longer updated too.')
+    sub.add_argument('--lang', default='da', choices=['da', 'en'])
+    sub.add_argument('--format', default='parquet', choices=['parquet', 'arrow'])
+    sub.add_argument('--workers', type=int, default=4,
+                     help='Number of tables fetched concurrently.')
+    sub.add_argument('--rate-limit', type=float, default=None,
+                     help='Maximum number of requests per second.')
+    sub.add_argument('--retries', type=int, default=3)
+    sub.add_argument('--max-cells', type=int, default=MAX_CELLS,
+                     help='Cells per data request; larger tables are split.')
+    sub.add_argument('--base-url', default='https://api.statbank.dk/v1/')
+    sub.add_argument('--quiet', action='store_true',
+                     help='Only report failed tables.')
+    sub.set_defaults(func=_mirror)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
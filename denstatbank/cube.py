@@ -0,0 +1,307 @@
+import json
+import threading
+import time
+from .utils import _category_codes, _dense_status, _dense_values
+
+
+class Cube:
+    """Cells of one table received for selections of the same variables.
+
+    The API drops eliminated variables that are not selected and picks
+    default values for the others, so responses are only comparable when
+    they select the same variable codes. A cube holds the cells of such
+    responses in dense numpy arrays with one axis per dimension, in
+    dimension order. Each axis grows as responses bring new category codes,
+    and a boolean mask records which cells have been received.
+
+    Attributes
+    ----------
+    updated : str
+        The 'updated' timestamp of the table (as in tables() and
+        tableinfo()) the cells belong to.
+    checked : float
+        Time at which updated was last confirmed.
+    ids : list of str
+        Dimension ids of the cells, or None while the cube is empty.
+    positions : list of dicts
+        {category code: position} along each axis.
+    values : np.ndarray
+        float64 values, NaN where null or not received.
+    mask : np.ndarray
+        True for the cells received.
+    status : np.ndarray
+        Object array of the status of the cells, or None if no response
+        had a status.
+    """
+
+    def __init__(self, updated=None):
+        self.updated = updated
+        self.checked = time.time()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self, ids=None):
+        import numpy as np
+        self.ids = ids
+        self.positions = [{} for _ in ids or []]
+        shape = [0] * len(ids or [])
+        self.values = np.full(shape, np.nan)
+        self.mask = np.zeros(shape, dtype=bool)
+        self.status = None
+        self._meta = {}
+        self._extra = {}
+        self._dimension = {}
+
+    def __len__(self):
+        return int(self.mask.sum()) if self.ids is not None else 0
+
+    def clear(self, updated=None):
+        """Drops all cells, e.g. when the table has been updated."""
+        with self._lock:
+            self.updated = updated
+            self._reset()
+
+    def _grow(self):
+        """Enlarges the arrays to the number of codes known per axis."""
+        import numpy as np
+        shape = tuple(len(p) for p in self.positions)
+        if shape == self.values.shape:
+            return
+        old = tuple(slice(0, n) for n in self.values.shape)
+        values = np.full(shape, np.nan)
+        values[old] = self.values
+        mask = np.zeros(shape, dtype=bool)
+        mask[old] = self.mask
+        self.values, self.mask = values, mask
+        if self.status is not None:
+            status = np.full(shape, None, dtype=object)
+            status[old] = self.status
+            self.status = status
+
+    def add(self, ddict):
+        """Stores the cells of a JSON-stat dataset."""
+        import numpy as np
+        dimension = ddict['dimension']
+        ids = list(dimension['id'])
+        codes = [_category_codes(dimension[k]['category']) for k in ids]
+        sizes = [len(c) for c in codes]
+        n = int(np.prod(sizes, dtype=np.int64))
+        values = _dense_values(ddict['value'], n).reshape(sizes)
+        with self._lock:
+            if self.ids != ids:
+                self._reset(ids)
+            for k, kc, positions in zip(ids, codes, self.positions):
+                for c in kc:
+                    positions.setdefault(c, len(positions))
+                self._merge_dimension(k, dimension[k])
+            self._grow()
+            idx = np.ix_(*[np.array([p[c] for c in kc], dtype=np.intp)
+                           for kc, p in zip(codes, self.positions)])
+            self.values[idx] = values
+            self.mask[idx] = True
+            if ddict.get('status'):
+                if self.status is None:
+                    self.status = np.full(self.values.shape, None, dtype=object)
+                self.status[idx] = _dense_status(ddict['status'], n).reshape(sizes)
+            elif self.status is not None:
+                self.status[idx] = None
+            self._extra = {k: v for k, v in dimension.items()
+                           if k not in ('id', 'size') and k not in ids}
+            self._meta = {k: v for k, v in ddict.items()
+                          if k not in ('dimension', 'value', 'status')}
+
+    def _merge_dimension(self, k, dim):
+        stored = self._dimension.setdefault(k, {'category': {}})
+        stored.update({key: v for key, v in dim.items() if key != 'category'})
+        for key, v in dim['category'].items():
+            if key != 'index' and isinstance(v, dict):
+                stored['category'].setdefault(key, {}).update(v)
+
+    def _axes(self, variables):
+        """Codes of each dimension selected by expanded variables, and the
+        positions of the selected dimensions, or None if the variables do
+        not match the cube."""
+        selected = {d['code'].lower(): d['values'] for d in variables}
+        lower = [k.lower() for k in self.ids]
+        if set(selected) - set(lower):
+            return None
+        axes = [list(selected[k]) if k in selected else list(p)
+                for p, k in zip(self.positions, lower)]
+        return axes, [n for n, k in enumerate(lower) if k in selected]
+
+    def _take(self, array, axes, fill):
+        """Sub-block of an array for the codes of each axis, with fill for
+        the codes that are not known."""
+        import numpy as np
+        idx = [np.array([p.get(c, -1) for c in codes], dtype=np.intp)
+               for codes, p in zip(axes, self.positions)]
+        if any((i < 0).any() for i in idx):
+            array = np.pad(array, [(0, 1)] * array.ndim, constant_values=fill)
+        return array[np.ix_(*idx)]
+
+    def missing(self, variables):
+        """Returns the selections that have to be requested to complete
+        the cells of expanded variables.
+
+        Slices of the selected values that are missing as a whole are
+        grouped into a single selection per variable, so adding a region
+        or a period to a cached selection requests only that region or
+        period.
+
+        Parameters
+        ----------
+        variables : list of dicts
+            Variable dictionaries with explicit values, see
+            utils.expand_variables().
+
+        Returns
+        -------
+        list of variable lists, empty if all cells are present.
+        """
+        with self._lock:
+            found = None if self.ids is None else self._axes(variables)
+            if found is None:
+                return [variables]
+            axes, selected = found
+            fixed = tuple(n for n in range(len(axes)) if n not in selected)
+            present = self._take(self.mask, axes, False)
+            missing = ~present.all(axis=fixed) if fixed else ~present
+        box = [axes[n] for n in selected]
+        codes = [self.ids[n] for n in selected]
+        by_code = {d['code'].lower(): d for d in variables}
+        return [[dict(by_code[k.lower()], values=values)
+                 for k, values in zip(codes, b)]
+                for b in _missing_boxes(box, missing, 0)]
+
+    def dataset(self, variables, values_array=False):
+        """Assembles a JSON-stat dataset for expanded variables from the
+        stored cells. Cells that are not stored are null.
+
+        If values_array is True, 'value' is a float64 array with NaN for
+        nulls, as returned by the decoders with values_array.
+        """
+        import numpy as np
+        with self._lock:
+            axes, _ = self._axes(variables)
+            dimension = {}
+            for k, codes in zip(self.ids, axes):
+                stored = self._dimension[k]
+                category = {key: {c: v[c] for c in codes if c in v}
+                            for key, v in stored['category'].items()}
+                category['index'] = {c: n for n, c in enumerate(codes)}
+                dimension[k] = dict(stored, category=category)
+            dimension.update(self._extra)
+            dimension.update(id=list(self.ids), size=[len(a) for a in axes])
+            values = self._take(self.values, axes, np.nan).ravel()
+            status = None
+            if self.status is not None:
+                status = self._take(self.status, axes, None).ravel()
+        if not values_array:
+            values = np.where(np.isnan(values), None, values).tolist()
+        ddict = dict(self._meta, dimension=dimension, value=values)
+        if status is not None:
+            found = np.flatnonzero(np.not_equal(status, None))
+            if len(found):
+                ddict['status'] = {str(n): status[n] for n in found}
+        return ddict
+
+
+def _missing_boxes(box, missing, start):
+    """Covers the missing cells of a box (a list of value lists, and a
+    boolean array with an axis per list) with a few boxes, peeling off the
+    values whose slice is entirely missing one axis at a time."""
+    import numpy as np
+    if not missing.any():
+        return []
+    axes = range(missing.ndim)
+    keep = [missing.any(axis=tuple(a for a in axes if a != n)) for n in axes]
+    missing = missing[np.ix_(*keep)]
+    box = [[v for v, k in zip(values, kept) if k] for values, kept in zip(box, keep)]
+    if start == len(box):
+        return [box]
+    others = tuple(a for a in axes if a != start)
+    full = missing.all(axis=others)
+    boxes = []
+    if full.any():
+        boxes.append(box[:start] + [[v for v, f in zip(box[start], full) if f]]
+                     + box[start + 1:])
+    if not full.all():
+        partial = ~full
+        boxes.extend(_missing_boxes(
+            box[:start] + [[v for v, p in zip(box[start], partial) if p]] + box[start + 1:],
+            missing[(slice(None),) * start + (partial,)], start + 1))
+    return boxes
+
+
+class CubeStore:
+    """In-memory store of the cells received by StatBankClient.data(), used
+    to request only the parts of a selection that are not stored yet.
+
+    Cubes are kept per table, language, set of selected variable codes and
+    other request parameters. A cube is emptied when tableinfo() reports
+    a new 'updated' timestamp for its table, and refresh() drops the cubes
+    of the tables listed as updated by tables().
+
+    Examples
+    --------
+    >>> sbc = StatBankClient(cube_store=True)
+    >>> omr = sbc.variable_dict('OMRÅDE', ['101', '147'])
+    >>> df = sbc.data('folk1a', variables=[omr])
+    >>> omr = sbc.variable_dict('OMRÅDE', ['101', '147', '151'])
+    >>> df = sbc.data('folk1a', variables=[omr])   # requests only '151'
+    """
+
+    def __init__(self):
+        self._cubes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cubes)
+
+    @staticmethod
+    def key(table_id, lang, codes, params=None):
+        """Key of the cube of a table for a set of variable codes."""
+        return json.dumps([table_id.upper(), lang, sorted(c.lower() for c in codes),
+                           params or {}], sort_keys=True, ensure_ascii=False)
+
+    def cube(self, table_id, lang, codes, params=None, updated=None):
+        """Returns the cube for a selection, emptied if updated differs
+        from the timestamp of its cells."""
+        key = self.key(table_id, lang, codes, params)
+        with self._lock:
+            cube = self._cubes.get(key)
+            if cube is None:
+                cube = self._cubes[key] = Cube(updated)
+        if updated is not None and cube.updated != updated:
+            cube.clear(updated)
+        cube.checked = time.time()
+        return cube
+
+    def refresh(self, tables, past_days=None):
+        """Drops the cubes of the tables updated according to a tables()
+        response, and those last checked before the past_days window.
+
+        Returns
+        -------
+        int, the number of cubes removed.
+        """
+        updated = {t['id'].upper(): t['updated'] for t in tables}
+        cutoff = time.time() - past_days * 86400 if past_days else None
+        with self._lock:
+            stale = []
+            for key, cube in self._cubes.items():
+                table_id = json.loads(key)[0]
+                if cutoff is not None and cube.checked < cutoff:
+                    stale.append(key)
+                elif table_id in updated and updated[table_id] != cube.updated:
+                    stale.append(key)
+                else:
+                    cube.checked = time.time()
+            for key in stale:
+                del self._cubes[key]
+        return len(stale)
+
+    def clear(self):
+        """Removes all cubes."""
+        with self._lock:
+            self._cubes.clear()
@@ -0,0 +1,106 @@
+import importlib
+import json
+
+# Optional backends, imported on first use.
+_backends = {}
+
+
+def _backend(name):
+    """Returns the optional backend module, or None if not installed."""
+    try:
+        return _backends[name]
+    except KeyError:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            module = None
+        return _backends.setdefault(name, module)
+
+
+def stdlib_loads(content, values_array=False):
+    """Decodes a response body with the standard library json module."""
+    return json.loads(content)
+
+
+def orjson_loads(content, values_array=False):
+    """Decodes a response body with orjson."""
+    return _backend('orjson').loads(content)
+
+
+def simdjson_loads(content, values_array=False):
+    """Decodes a response body with simdjson.
+
+    If values_array is True and the body is a JSON-stat data response, the
+    dataset 'value' array is read straight into a float64 numpy array
+    without building a Python list, as long as it holds no nulls.
+    """
+    simdjson = _backend('simdjson')
+
+    def plain(v):
+        if isinstance(v, simdjson.Object):
+            return v.as_dict()
+        if isinstance(v, simdjson.Array):
+            return v.as_list()
+        return v
+
+    doc = simdjson.Parser().parse(content)
+    if not values_array or not isinstance(doc, simdjson.Object) or 'dataset' not in doc:
+        return plain(doc)
+    dataset = doc['dataset']
+    out = {k: plain(v) for k, v in dataset.items() if k != 'value'}
+    value = dataset['value']
+    out['value'] = plain(value)
+    # Only dense values have a buffer; sparse values are an object.
+    if isinstance(value, simdjson.Array):
+        import numpy as np
+        try:
+            out['value'] = np.frombuffer(value.as_buffer(of_type='d'), dtype=np.float64)
+        except (TypeError, ValueError):
+            pass
+    return {'dataset': out}
+
+
+DECODERS = {'json': stdlib_loads, 'orjson': orjson_loads,
+            'simdjson': simdjson_loads}
+
+
+def available_decoders():
+    """Names of the decoders that can be used in this environment."""
+    return ['json'] + [name for name in ('orjson', 'simdjson')
+                       if _backend(name) is not None]
+
+
+def get_decoder(decoder=None):
+    """Returns the function used to decode response bodies.
+
+    Parameters
+    ----------
+    decoder : str or callable, default is None
+        One of 'json', 'orjson' or 'simdjson', or a function taking the
+        response bytes. If None, simdjson is used for data responses that
+        are converted to dataframes and orjson otherwise, falling back to
+        the standard library when they are not installed.
+
+    Returns
+    -------
+    function(content, values_array=False)
+    """
+    if decoder is None:
+        return auto_loads
+    if callable(decoder):
+        return lambda content, values_array=False: decoder(content)
+    if decoder not in DECODERS:
+        raise ValueError(f'Unknown decoder {decoder!r}, use one of {list(DECODERS)}.')
+    if decoder not in available_decoders():
+        raise ImportError(f'The {decoder} package is not installed.')
+    return DECODERS[decoder]
+
+
+def auto_loads(content, values_array=False):
+    """Decodes with the fastest installed backend. simdjson is only loaded
+    for data responses converted to dataframes."""
+    if values_array and _backend('simdjson') is not None:
+        return simdjson_loads(content, values_array=True)
+    if _backend('orjson') is not None:
+        return orjson_loads(content)
+    return stdlib_loads(content)
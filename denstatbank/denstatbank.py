@@ -1,7 +1,32 @@
+import json
+import time
 import requests
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed as as_completed_futures
 from urllib.parse import quote
-from .utils import data_dict_to_df, add_list_to_dict, subtabtree
+from .cache import MetadataCache, ResponseCache
+from .cube import CubeStore
+from .align import Aligner
+from .tree import SubjectTree
+from .decoders import get_decoder
+from .metrics import MetricsSink
+from .exceptions import (request_error, StatBankTimeoutError,
+                         StatBankConnectionError, StatBankCellLimitError)
+from .utils import (data_dict_to_df, add_list_to_dict, subtabtree,
+                    bulk_lines_to_dfs, expand_variables, split_variables,
+                    count_cells,
+                    merge_datasets, variables_to_df, retry_delay,
+                    error_message, canonical_variables, RateLimiter,
+                    compact_df, ValueLookup, relabel_df, _category_codes)
+
+# Maximum number of cells the API returns for a single data request.
+MAX_CELLS = 1000000
+
+# Response status codes of requests that are retried.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Output backends of data(), tables() and tableinfo(variables_df=True).
+BACKENDS = ('pandas', 'arrow', 'polars', 'raw')
 
 
 class StatBankClient:
@@ -14,12 +39,97 @@ class StatBankClient:
         must be in Danish. Please see data() method docstring for details. 
         As long as Danish key codes are provided as input, one can use the 
         Class with English language settings.
+    cache : str, path-like or MetadataCache, default is None
+        If given, tableinfo() and subjects() responses are stored in a
+        persistent metadata cache at this location. Use refresh_cache() to
+        drop the entries of tables that have been updated since.
+    decoder : str or callable, default is None
+        JSON decoder for the responses: 'json', 'orjson', 'simdjson' or a
+        function taking the response bytes. By default the fastest
+        installed one is used. See denstatbank.decoders.get_decoder().
+    pool_size : int, default is 10
+        Maximum number of connections kept alive by the session, which
+        should be at least the number of threads using the client.
+    timeout : float or tuple, default is (5, 60)
+        Connect and read timeouts in seconds for each request.
+    retries : int, default is 3
+        Number of times a request is retried after a timeout, a connection
+        error or a 429/5xx response.
+    backoff_factor : float, default is 0.5
+        Retries wait a random time up to backoff_factor * 2 ** attempt
+        seconds, or the time given by a Retry-After header.
+    max_backoff : float, default is 30
+        Upper bound in seconds of the wait between retries.
+    rate_limit : float, default is None
+        If given, the maximum number of requests per second sent by the
+        client, shared by all threads (including data_many() workers).
+    compact : bool, default is False
+        If True, the dataframes returned by tables(), tableinfo(), data()
+        and data_stream() use memory efficient dtypes (category for
+        repeated labels, nullable and downcast numbers, datetime64 for
+        'updated'). Each of these methods takes a compact argument to
+        override it per call. See utils.compact_df().
+    base_url : str, default is 'https://api.statbank.dk/v1/'
+        Root URL of the API, e.g. of a local mirror or test server.
+    backend : str, {'pandas', 'arrow', 'polars', 'raw'} default is 'pandas'
+        Output of data(), tables() and tableinfo(variables_df=True):
+        pandas dataframes, pyarrow tables or polars dataframes built
+        directly from the responses (with dictionary encoded dimensions),
+        or the decoded responses. Each of these methods takes a backend
+        argument to override it per call.
+    memory_cache : bool or ResponseCache, default is None
+        If True or a ResponseCache, response bodies are kept in memory for
+        a few minutes (see cache.RESPONSE_TTLS) and identical requests,
+        including concurrent ones, are answered from memory.
+    cube_store : bool or CubeStore, default is None
+        If True or a CubeStore, the cells received by data() are kept in
+        memory and data() requests only the parts of a selection that are
+        not stored yet. See denstatbank.cube.
+    metrics : MetricsSink, default is None
+        Receives the latency, size, decoding and conversion time, retries,
+        errors and cache hits of the requests, e.g. an InMemoryMetrics.
+        By default nothing is recorded. See denstatbank.metrics.
+
+    Raises
+    ------
+    Errors from the API are raised as StatBankRequestError (or the
+    StatBankRateLimitError and StatBankServerError subclasses), and
+    timeouts and connection failures as StatBankTimeoutError and
+    StatBankConnectionError. See denstatbank.exceptions.
     """
 
-    def __init__(self, lang='da'):
+    def __init__(self, lang='da', cache=None, decoder=None, pool_size=10,
+                 timeout=(5, 60), retries=3, backoff_factor=0.5, max_backoff=30,
+                 rate_limit=None, compact=False,
+                 base_url='https://api.statbank.dk/v1/', backend='pandas',
+                 memory_cache=None, cube_store=None, metrics=None):
         self._lang = lang
         self.session = requests.session()
-        self._base_url = 'https://api.statbank.dk/v1/'
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.compact = compact
+        self._lookups = {}
+        self._aligner = Aligner(self)
+        self._base_url = base_url
+        self.backend = self._backend(backend)
+        self.metrics = metrics if metrics is not None else MetricsSink()
+        if cache is not None and not isinstance(cache, MetadataCache):
+            cache = MetadataCache(cache)
+        self.cache = cache
+        if memory_cache is True:
+            memory_cache = ResponseCache()
+        elif memory_cache is False:
+            memory_cache = None
+        self.memory_cache = memory_cache
+        self.cube_store = CubeStore() if cube_store is True else cube_store or None
+        self._decode = get_decoder(decoder)
 
     @property
     def lang(self):
@@ -32,21 +142,149 @@ class StatBankClient:
                 'Language can only accept either "en" or "da" as values.')
         self._lang = value
 
-    def _base_request(self, cat, params):
+    def _post(self, cat, params, **kwargs):
+        """
+        Submits a POST request, retrying timeouts, connection errors and
+        429/5xx responses with exponential backoff, and returns the
+        successful response. Raises a StatBankError otherwise.
+        """
+        url = self._base_url+quote(cat)
+        metrics = self.metrics
+        stream = kwargs.get('stream', False)
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            start = time.perf_counter()
+            try:
+                resp = self.session.post(url, json=params, timeout=self.timeout,
+                                         **kwargs)
+            except requests.Timeout as ex:
+                reason = 'timeout'
+                if last:
+                    metrics.increment('errors', endpoint=cat, reason=reason)
+                    raise StatBankTimeoutError(str(ex)) from ex
+                delay = retry_delay(attempt, self.backoff_factor, self.max_backoff)
+            except requests.ConnectionError as ex:
+                reason = 'connection'
+                if last:
+                    metrics.increment('errors', endpoint=cat, reason=reason)
+                    raise StatBankConnectionError(str(ex)) from ex
+                delay = retry_delay(attempt, self.backoff_factor, self.max_backoff)
+            else:
+                if not stream:
+                    metrics.observe('response_bytes', len(resp.content), endpoint=cat)
+                metrics.observe('request_seconds', time.perf_counter() - start,
+                                endpoint=cat)
+                metrics.observe('server_seconds', resp.elapsed.total_seconds(),
+                                endpoint=cat)
+                metrics.observe('request_bytes', len(resp.request.body or b''),
+                                endpoint=cat)
+                if resp.status_code == 200:
+                    return resp
+                reason = str(resp.status_code)
+                if last or resp.status_code not in RETRY_STATUSES:
+                    metrics.increment('errors', endpoint=cat, reason=reason)
+                    message = error_message(resp.content)
+                    resp.close()
+                    raise request_error(resp.status_code, message)
+                delay = retry_delay(attempt, self.backoff_factor, self.max_backoff,
+                                    resp.headers.get('Retry-After'))
+                resp.close()
+            metrics.increment('retries', endpoint=cat, reason=reason)
+            time.sleep(delay)
+
+    def _base_request(self, cat, params, values_array=False):
         """
         Submits all POST request to API and returns response.
         Used internally by all client facing methods.
+        If values_array is True, the 'value' array of a data response may
+        be decoded straight into a numpy array.
         """
-        params.update({'lang': self.lang})
-        try:
-            resp = self.session.post(self._base_url+quote(cat), json=params)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                response_message = resp.json()['message']
-                print(response_message)
-        except Exception as ex:
-            raise ex
+        params.setdefault('lang', self.lang)
+        if self.memory_cache is None:
+            content = self._post(cat, params).content
+        else:
+            content, hit = self.memory_cache.fetch(
+                cat, params, lambda: self._post(cat, params).content)
+            self.metrics.increment('cache_hits' if hit else 'cache_misses',
+                                   cache='memory')
+        start = time.perf_counter()
+        decoded = self._decode(content, values_array)
+        self.metrics.observe('decode_seconds', time.perf_counter() - start,
+                             endpoint=cat)
+        return decoded
+
+    def _backend(self, backend):
+        """The output backend of a call, defaulting to the client one."""
+        backend = backend or self.backend
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend {backend!r}, use one of {list(BACKENDS)}.')
+        return backend
+
+    @staticmethod
+    def _columnar(table, backend):
+        """Returns an Arrow table as is, or as a polars dataframe."""
+        if backend == 'polars':
+            from .io import _require_polars
+            return _require_polars().from_arrow(table)
+        return table
+
+    def _compact(self, df, compact):
+        """Applies compact_df() if requested per call or by the client."""
+        if compact is None:
+            compact = self.compact
+        return compact_df(df) if compact else df
+
+    def _cached_request(self, cat, key, params):
+        """
+        Returns the response from the metadata cache if present, otherwise
+        submits the request and stores the response in the cache.
+        """
+        if self.cache is None:
+            return self._base_request(cat, params)
+        lang = params.get('lang', self.lang)
+        resp = self.cache.get(cat, key, lang)
+        if resp is None:
+            self.metrics.increment('cache_misses', cache='metadata')
+            resp = self._base_request(cat, params)
+            updated = resp.get('updated') if isinstance(resp, dict) else None
+            self.cache.put(cat, key, lang, resp, updated)
+        else:
+            self.metrics.increment('cache_hits', cache='metadata')
+        return resp
+
+    def refresh_cache(self, past_days=1):
+        """Removes the stale entries from the metadata cache.
+
+        A single tables() request for the tables updated in the last
+        past_days days is used to find the tableinfo() entries that are out
+        of date. Entries that were last checked longer ago than past_days
+        are removed too, so past_days should cover the time since the
+        previous refresh. The in-memory response cache is cleared, and the
+        cube store drops the cells of updated tables in the same way.
+
+        Parameters
+        ----------
+        past_days : int, default is 1
+
+        Returns
+        -------
+        int, the number of entries removed.
+        """
+        if self.cache is None and self.cube_store is None:
+            raise ValueError('The client was created without a cache.')
+        if self.memory_cache is not None:
+            self.memory_cache.clear()
+        tables = self.tables(past_days=past_days, include_inactive=True,
+                             as_df=False)
+        self._lookups.clear()
+        removed = 0
+        if self.cache is not None:
+            removed += self.cache.refresh(tables, past_days)
+        if self.cube_store is not None:
+            removed += self.cube_store.refresh(tables, past_days)
+        return removed
 
     def subjects(self, subjects=None, include_tables=False, recursive=False, as_tree=True):
         """Retrieves the basic subject(s) information for which tables exist in
@@ -93,7 +331,8 @@ class StatBankClient:
         cat = 'subjects'
         params = dict(includeTables=include_tables, recursive=recursive)
         add_list_to_dict(params, subjects=subjects)
-        resp = self._base_request(cat, params)
+        key = json.dumps(params, sort_keys=True)
+        resp = self._cached_request(cat, key, params)
         if resp is not None:
             if not as_tree:
                 return resp
@@ -103,7 +342,36 @@ class StatBankClient:
                         for g in subtabtree(d):
                             print(g)
 
-    def tables(self, subjects=None, past_days=None, include_inactive=False, as_df=True):
+    def subject_tree(self, subjects=None, include_tables=True, lazy=True):
+        """Returns the subject hierarchy as a SubjectTree.
+
+        Parameters
+        ----------
+        subjects : list, default is None
+            Subject ids to start from, or the top level subjects.
+        include_tables : bool, default is True
+            If True, tables are included as leaves of the tree.
+        lazy : bool, default is True
+            If True, only the requested level is fetched and subjects are
+            expanded on demand with SubjectTree.expand(). Otherwise the
+            whole hierarchy is fetched with a single recursive request.
+
+        Returns
+        -------
+        SubjectTree
+
+        Examples
+        --------
+        >>> tree = sbc.subject_tree()
+        >>> tree.expand('02')
+        [SubjectNode('2401', 'Population and population projections'), ...]
+        """
+        resp = self.subjects(subjects=subjects, include_tables=include_tables,
+                             recursive=not lazy, as_tree=False)
+        return SubjectTree.from_response(resp, self, include_tables)
+
+    def tables(self, subjects=None, past_days=None, include_inactive=False, as_df=True,
+               compact=None, backend=None):
         """Retrieves the complete list of tables present currently in the
         Statbank database together with relevant metadata.
 
@@ -119,6 +387,12 @@ class StatBankClient:
         as_df : bool, default is True
             If true, returns a pandas dataframe, otherwise returns a list of
             dictionaries.
+        compact : bool, default is None
+            If True, uses memory efficient dtypes. Defaults to the client
+            compact setting.
+        backend : str, default is None
+            Output backend, see StatBankClient. Defaults to the client
+            backend.
 
         Returns
         -------
@@ -144,13 +418,18 @@ class StatBankClient:
         cat = 'tables'
         params = dict(pastdays=past_days, includeinactive=include_inactive)
         add_list_to_dict(params, subjects=subjects)
+        backend = self._backend(backend)
         resp = self._base_request(cat, params)
-        if as_df and resp is not None:
-            return pd.DataFrame(resp)
-        else:
+        if not as_df or resp is None or backend == 'raw':
             return resp
+        if backend == 'pandas':
+            import pandas as pd
+            return self._compact(pd.DataFrame(resp), compact)
+        from .io import records_to_arrow
+        return self._columnar(records_to_arrow(resp), backend)
 
-    def tableinfo(self, table_id, variables_df=False):
+    def tableinfo(self, table_id, variables_df=False, compact=None, lang=None,
+                  backend=None):
         """Retrieves table specific information from the StatBank database.
 
         Parameters
@@ -158,8 +437,17 @@ class StatBankClient:
         table_id : str
         variables_df : bool, default is False
             If true, returns the variable names and possible values as a
-            pandas dataframe, otherwise returns a dictionary including
-            additional metadata.
+            pandas dataframe indexed by (variable, id), otherwise returns a
+            dictionary including additional metadata.
+        compact : bool, default is None
+            If True, uses memory efficient dtypes. Defaults to the client
+            compact setting.
+        lang : str, {'da', 'en'} default is None
+            Language of the response. Defaults to the client language.
+        backend : str, default is None
+            Output backend of variables_df, see StatBankClient. The
+            'arrow' and 'polars' tables have 'variable', 'id' and 'text'
+            columns. Defaults to the client backend.
 
         Returns
         -------
@@ -169,35 +457,183 @@ class StatBankClient:
         --------
         >>> vdf = sbc.tableinfo(table_id='bef5', variables_df=True)
         >>> vdf.head()
-          id     text variable
-        0  M     Mænd      KØN
-        1  K  Kvinder      KØN
-        0  0     0 år    ALDER
-        1  1     1 år    ALDER
-        2  2     2 år    ALDER
+                         text
+        variable id
+        KØN      M       Mænd
+                 K    Kvinder
+        ALDER    0       0 år
+                 1       1 år
+                 2       2 år
+        >>> vdf.loc['ALDER'].index.tolist()[:3]
+        ['0', '1', '2']
         """
         cat = 'tableinfo'
-        params = dict(table=table_id)
-        resp = self._base_request(cat, params)
+        params = dict(table=table_id, lang=lang or self.lang)
+        backend = self._backend(backend)
+        resp = self._cached_request(cat, table_id.upper(), params)
         if resp is not None:
-            if variables_df:
-                var_df = pd.DataFrame()
-                varlist = resp['variables']
-                for d in varlist:
-                    df = pd.DataFrame(d['values'])
-                    if params['lang'] == 'en':
-                        df['variable'] = d['text']
-                    else:
-                        df['variable'] = d['id']
-                    var_df = pd.concat([var_df, df])
-                return var_df
-            else:
+            if not variables_df or backend == 'raw':
                 return resp
+            if backend == 'pandas':
+                return self._compact(variables_to_df(resp['variables'], params['lang']),
+                                     compact)
+            from .io import variables_to_arrow
+            return self._columnar(variables_to_arrow(resp['variables'], params['lang']),
+                                  backend)
+
+    def lookup(self, table_id, lang=None, updated=None):
+        """Returns code/text lookups for the variable values of a table.
+
+        The lookups are built once per table and language from tableinfo()
+        and kept by the client, so translating selections and results does
+        not require further requests or scanning a dataframe.
+
+        Parameters
+        ----------
+        table_id : str
+        lang : str, {'da', 'en'} default is None
+            Language of the texts. Defaults to the client language.
+        updated : str, default is None
+            The 'updated' timestamp of the table, e.g. from tables(). If it
+            differs from the one of the kept lookups, they are rebuilt.
+
+        Returns
+        -------
+        ValueLookup
+
+        Examples
+        --------
+        >>> lk = sbc.lookup('folk1a', lang='en')
+        >>> lk.text('KØN', '1')
+        'Men'
+        >>> lk.code('køn', ['Men', 'Women'])
+        ['1', '2']
+        """
+        key = (table_id.upper(), lang or self.lang)
+        lookup = self._lookups.get(key)
+        if lookup is not None and updated is not None:
+            if lookup.info.get('updated') != updated:
+                lookup = None
+        if lookup is None:
+            lookup = ValueLookup(self.tableinfo(table_id, lang=key[1]), key[1])
+            self._lookups[key] = lookup
+        return lookup
+
+    def join(self, dfs, tables=None, on=None, how='inner'):
+        """Joins data() results of several tables on the dimensions they
+        share, matching labels by their codes.
+
+        The integer code mappings of each dimension are built once and kept
+        by the client, see align.Aligner.
+
+        Parameters
+        ----------
+        dfs : list of pd.DataFrame
+            Results of data().
+        tables : list of str, default is None
+            Ids of the tables, registered so that the common grid follows
+            the tableinfo() order and texts of their values.
+        on : list of str, default is None
+            Index levels to join on, by default those shared by all dfs.
+        how : str, {'inner', 'outer'} default is 'inner'
+
+        Returns
+        -------
+        Multi-indexed pd.DataFrame with the columns of all dfs.
+
+        Examples
+        --------
+        >>> omr = sbc.variable_dict('OMRÅDE', ['101', '147'])
+        >>> tid = sbc.variable_dict('Tid', ['2019'])
+        >>> pop = sbc.data('folk1am', variables=[omr, tid])
+        >>> inc = sbc.data('indkp101', variables=[omr, tid])
+        >>> df = sbc.join([pop, inc], tables=['folk1am', 'indkp101'])
+        """
+        for table_id in tables or []:
+            self._aligner.add_table(table_id)
+        return self._aligner.join(dfs, on=on, how=how)
+
+    def relabel(self, df, table_id, lang=None):
+        """Translates the labels of a dataframe returned by data() into
+        another language, without requesting the data again.
+
+        The index labels are mapped level by level through their category
+        codes to the texts of the memoized tableinfo() of the target
+        language, and the value column is renamed after the dataset label
+        in that language.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            A dataframe returned by data() for table_id.
+        table_id : str
+        lang : str, {'da', 'en'} default is None
+            Target language. Defaults to the client language.
+
+        Returns
+        -------
+        pd.DataFrame
+
+        Examples
+        --------
+        >>> sbc = StatBankClient(lang='da')
+        >>> da = sbc.data('folk1a', variables=[kon])
+        >>> en = sbc.relabel(da, 'folk1a', lang='en')
+        """
+        lookup = self.lookup(table_id, lang)
+        return relabel_df(df, lookup, lookup.info.get('text'))
+
+    def validate_variables(self, table_id, variables, max_cells=MAX_CELLS):
+        """Checks a variables selection against the metadata of a table
+        without requesting any data.
+
+        The table metadata is fetched once and kept by the client (see
+        lookup()), so repeated validations do not send requests.
+
+        Parameters
+        ----------
+        table_id : str
+        variables : list
+            List of dictionaries with variable parameters, as in data().
+        max_cells : int, default is MAX_CELLS
+            Maximum number of cells the selection may select, or None.
 
-    def data(self, table_id, as_df=True, variables=None, **kwargs):
+        Returns
+        -------
+        tuple of (list, int)
+            The selection with all value patterns expanded to explicit
+            values, and the number of cells it selects.
+
+        Raises
+        ------
+        StatBankValidationError
+            If a variable code or value is not valid for the table.
+        StatBankCellLimitError
+            If the selection selects more than max_cells cells.
+
+        Examples
+        --------
+        >>> tid = sbc.variable_dict(code='Tid', values=['>=2019K1'])
+        >>> expanded, cells = sbc.validate_variables('folk1a', [tid])
+        >>> expanded[0]['values']
+        ['2019K1', '2019K2', '2019K3', '2019K4', '2020K1']
+        """
+        info = self.lookup(table_id).info
+        expanded = expand_variables(variables or [], info, strict=True)
+        cells = count_cells(expanded)
+        if max_cells is not None and cells > max_cells:
+            raise StatBankCellLimitError(cells, max_cells)
+        return expanded, cells
+
+    def data(self, table_id, as_df=True, variables=None, max_cells=None,
+             max_workers=4, compact=None, validate=False, parse_time=False,
+             all_dims=False, backend=None, **kwargs):
         """Retrieves the data for a specific table from the StatBank
         database.
 
+        If the client has a cube store and variables are given, only the
+        cells of the selection that are not stored yet are requested.
+
         Parameters
         ----------
         table : str,
@@ -208,11 +644,42 @@ class StatBankClient:
             List of dictionaries with variable parameters.
             Use make_variables_dict() method to generate these dictionaries
             in the prescribed format.
+        max_cells : int, default is None
+            If given, the size of the selection is estimated from the
+            tableinfo() metadata, and selections larger than max_cells are
+            split into several requests (along 'Tid' first) which are sent
+            concurrently and merged back into a single result in the
+            original order. Use MAX_CELLS for the limit of the API.
+        max_workers : int, default is 4
+            Number of concurrent requests used when a selection is split.
+        validate : bool, default is False
+            If True, the selection is checked with validate_variables()
+            before any data is requested, so that invalid codes or values
+            and selections over the cell limit (when they are not split
+            with max_cells) raise locally.
+        compact : bool, default is None
+            If True, uses memory efficient dtypes. Defaults to the client
+            compact setting.
+        parse_time : bool, default is False
+            If True, the 'tid' index level is a pd.PeriodIndex with the
+            frequency of the table (e.g. quarterly for '2020K1'), see
+            utils.parse_periods().
+        all_dims : bool, default is False
+            If True, every dimension of the response is included in the
+            index (or as a column), including 'ContentsCode' and the
+            variables that were not selected. By default only the
+            selected variables are.
+        backend : str, default is None
+            Output backend, see StatBankClient. The 'arrow' and 'polars'
+            tables have a dictionary encoded column per dimension in codes
+            and a float64 value column, and are built without pandas.
+            Defaults to the client backend.
         optional kwargs
 
         Returns
         -------
-        Single or multi-indexed pd.DataFrame or dict
+        Single or multi-indexed pd.DataFrame, pyarrow.Table, polars
+        DataFrame or dict
 
         Examples
         --------
@@ -234,13 +701,335 @@ class StatBankClient:
         add_list_to_dict(params, variables=variables)
         params.update({k: v for k, v in kwargs.items() if k})
         codes = [d['code'].lower() for d in variables] if variables else []
-        resp = self._base_request(cat, params)
+        backend = self._backend(backend)
+        as_df = as_df and backend != 'raw'
+        parts = None
+        if validate:
+            self.validate_variables(table_id, variables,
+                                    None if max_cells else MAX_CELLS)
+        if max_cells is not None and variables and self.cube_store is None:
+            info = self.lookup(table_id, params.get('lang')).info
+            parts = split_variables(expand_variables(variables, info, strict=validate),
+                                    max_cells)
+        if self.cube_store is not None and variables:
+            resp = self._cube_request(cat, params, max_cells, max_workers,
+                                      strict=validate, values_array=as_df)
+        elif parts is not None and len(parts) > 1:
+            resp = self._fan_out(cat, params, parts, max_workers)
+        else:
+            resp = self._base_request(cat, params, values_array=as_df)
         if as_df and resp is not None:
             ddict = resp['dataset']
-            return data_dict_to_df(ddict, codes)
+            self.metrics.observe('response_cells', len(ddict['value']), endpoint=cat)
+            return self._convert_dataset(ddict, codes, backend, compact=compact,
+                                         parse_time=parse_time, all_dims=all_dims)
         else:
             return resp
 
+    def _convert_dataset(self, ddict, codes, backend, compact=None,
+                         parse_time=False, all_dims=False, method='data'):
+        """Converts a JSON-stat dataset to the output of a backend other
+        than 'raw', as returned by data()."""
+        start = time.perf_counter()
+        if backend == 'pandas':
+            df = self._compact(data_dict_to_df(ddict, codes, all_dims=all_dims,
+                                               parse_time=parse_time),
+                               compact)
+        else:
+            from .io import dataset_to_arrow
+            df = self._columnar(dataset_to_arrow(ddict, codes, all_dims=all_dims),
+                                backend)
+        self.metrics.observe('convert_seconds', time.perf_counter() - start,
+                             method=method)
+        return df
+
+    def data_incremental(self, table_id, variables=None, revisions=0,
+                         as_df=True, tables=None, compact=None, parse_time=False,
+                         all_dims=False, backend=None, **kwargs):
+        """Retrieves the data for a specific table, fetching only the time
+        periods that are not already stored in the client cache.
+
+        The result of each (table, variables) selection is stored in the
+        metadata cache together with the table 'updated' timestamp. On the
+        next call, the timestamp is compared with the one listed by
+        tables(); if it is unchanged the stored result is returned without
+        any further request, otherwise only the new 'Tid' values (and the
+        trailing revisions periods) are requested and merged into the
+        stored result.
+
+        Parameters
+        ----------
+        table_id : str
+        variables : list, default is None
+            List of dictionaries with variable parameters, as in data().
+            A 'Tid' selection is only used for the first fetch; all
+            periods are selected when it is omitted.
+        revisions : int, default is 0
+            Number of already stored trailing periods to fetch again in
+            order to pick up revised values.
+        as_df : bool, default is True
+            If true, returns a multi-indexed pandas dataframe, otherwise
+            returns a dictionary as data(as_df=False).
+        tables : list of dicts, default is None
+            A tables(as_df=False) response to check the 'updated' timestamp
+            against. Pass it to share a single tables() request between
+            several tables. It is requested if not given.
+        compact, parse_time, all_dims, backend
+            Output options as in data(). They are applied to the merged
+            result, so the output matches data() for the same selection.
+        optional kwargs
+            Passed on to data(), e.g. max_cells.
+
+        Returns
+        -------
+        Multi-indexed pd.DataFrame, pyarrow.Table, polars DataFrame or dict
+
+        Examples
+        --------
+        >>> sbc = StatBankClient(cache='~/.cache/denstatbank')
+        >>> kon = sbc.variable_dict(code='KØN', values=['M', 'K'])
+        >>> df = sbc.data_incremental('folk1a', variables=[kon], revisions=1)
+        """
+        if self.cache is None:
+            raise ValueError('data_incremental() requires a client cache.')
+        variables = variables or []
+        tid = [d for d in variables if d['code'].lower() == 'tid']
+        others = [d for d in variables if d['code'].lower() != 'tid']
+        key = json.dumps(dict(table=table_id.upper(),
+                              variables=sorted(others, key=lambda d: d['code'].lower()),
+                              **kwargs), sort_keys=True)
+        if tables is None:
+            tables = self.tables(include_inactive=True, as_df=False)
+        updated = {t['id'].upper(): t['updated'] for t in tables or []}.get(
+            table_id.upper())
+        stored = self.cache.get('data', key, self.lang)
+        if stored is not None and updated is not None and updated == stored['updated']:
+            dataset = stored['dataset']
+        else:
+            self.cache.invalidate('tableinfo', table_id.upper())
+            info = self.tableinfo(table_id)
+            tid_var = [v for v in info['variables'] if v['id'].lower() == 'tid']
+            tid_code = tid_var[0]['id'] if tid_var else 'Tid'
+            periods = [x['id'] for x in tid_var[0]['values']] if tid_var else []
+            if stored is None:
+                values = tid[0]['values'] if tid else ['*']
+            elif stored['latest'] in periods:
+                start = periods.index(stored['latest']) + 1 - revisions
+                values = periods[max(0, start):]
+            else:
+                values = periods
+            dataset = stored['dataset'] if stored is not None else None
+            if values:
+                selection = others + [self.variable_dict(tid_code, values)]
+                resp = self.data(table_id, as_df=False, variables=selection,
+                                 **kwargs)
+                if dataset is None:
+                    dataset = resp['dataset']
+                else:
+                    dataset = merge_datasets([dataset, resp['dataset']])
+            latest = _category_codes(dataset['dimension'][tid_code]['category'])[-1]
+            self.cache.put('data', key, self.lang,
+                           {'dataset': dataset, 'latest': latest,
+                            'updated': updated}, updated)
+        backend = self._backend(backend)
+        if as_df and backend != 'raw':
+            codes = [d['code'].lower() for d in others] + ['tid']
+            return self._convert_dataset(dataset, codes, backend, compact=compact,
+                                         parse_time=parse_time, all_dims=all_dims,
+                                         method='data_incremental')
+        else:
+            return {'dataset': dataset}
+
+    def _fan_out(self, cat, params, parts, max_workers, merge=True):
+        """
+        Sends one data request per variables selection in parts on a
+        bounded thread pool sharing the client session, and merges the
+        resulting datasets, or returns the list of them if merge is False.
+        """
+        def request(variables):
+            return self._base_request(cat, dict(params, variables=variables))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resps = list(executor.map(request, parts))
+        if not merge:
+            return [r['dataset'] for r in resps]
+        return {'dataset': merge_datasets([r['dataset'] for r in resps])}
+
+    def _cube_request(self, cat, params, max_cells, max_workers, strict=False,
+                      values_array=False):
+        """
+        Answers a data request from the cube store, requesting only the
+        selections of cells missing from it.
+        """
+        lang = params.get('lang', self.lang)
+        info = self.lookup(params['table'], lang).info
+        variables = expand_variables(params['variables'], info, strict=strict)
+        extra = {k: v for k, v in params.items()
+                 if k not in ('table', 'variables', 'lang')}
+        cube = self.cube_store.cube(params['table'], lang,
+                                    [d['code'] for d in variables], extra,
+                                    info.get('updated'))
+        parts = cube.missing(variables)
+        self.metrics.increment('cache_misses' if parts else 'cache_hits',
+                               cache='cube')
+        if max_cells is not None:
+            parts = [p for part in parts for p in split_variables(part, max_cells)]
+        if parts:
+            for ddict in self._fan_out(cat, params, parts, max_workers, merge=False):
+                cube.add(ddict)
+        return {'dataset': cube.dataset(variables, values_array=values_array)}
+
+    def data_many(self, requests, as_df=True, max_workers=8, as_completed=False,
+                  **kwargs):
+        """Retrieves the data for many tables at once.
+
+        The requests are scheduled on a pool of worker threads sharing the
+        client session (and its rate_limit), and identical requests are
+        only sent once. Errors are returned in place of the result of the
+        request that failed instead of being raised.
+
+        Parameters
+        ----------
+        requests : list
+            Table ids, or (table_id, variables) tuples where variables is a
+            list of variable dictionaries as in data().
+        as_df : bool, default is True
+            Passed on to data().
+        max_workers : int, default is 8
+            Number of requests in flight at the same time.
+        as_completed : bool, default is False
+            If True, returns a generator of (position, result) tuples in the
+            order the requests complete, so that the results can be
+            processed while the other requests are still running.
+        optional kwargs
+            Passed on to data(), e.g. max_cells.
+
+        Returns
+        -------
+        list of pd.DataFrame, dict or Exception, in the order of requests,
+        or a generator of (position, result) tuples.
+
+        Examples
+        --------
+        >>> tid = sbc.variable_dict(code='Tid', values=['*'])
+        >>> dfs = sbc.data_many(['folk1a', ('bef5', [tid])])
+        >>> for i, df in sbc.data_many(tables, as_completed=True):
+        ...     process(df)
+        """
+        items = [(r, None) if isinstance(r, str) else tuple(r) for r in requests]
+        positions = {}
+        for i, (table_id, variables) in enumerate(items):
+            key = json.dumps([table_id.upper(), canonical_variables(variables)],
+                             sort_keys=True)
+            positions.setdefault(key, []).append(i)
+
+        def fetch(i):
+            table_id, variables = items[i]
+            try:
+                return self.data(table_id, as_df=as_df, variables=variables,
+                                 **kwargs)
+            except Exception as ex:
+                return ex
+
+        def run():
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(fetch, same[0]): same
+                           for same in positions.values()}
+                for future in as_completed_futures(futures):
+                    result = future.result()
+                    for n, i in enumerate(futures[future]):
+                        yield i, (result if n == 0 or not hasattr(result, 'copy')
+                                  else result.copy())
+
+        if as_completed:
+            return run()
+        results = [None] * len(items)
+        for i, result in run():
+            results[i] = result
+        return results
+
+    def data_stream(self, table_id, variables=None, chunksize=100000, compact=None,
+                    **kwargs):
+        """Streams the data for a specific table from the StatBank database
+        in chunks of pandas dataframes.
+
+        The data is requested in the BULK (semicolon separated) format and
+        the response body is read incrementally, so memory usage is bounded
+        by the chunksize rather than the size of the table.
+
+        Parameters
+        ----------
+        table_id : str
+        variables : list, default is None
+            List of dictionaries with variable parameters.
+            Use variable_dict() method to generate these dictionaries.
+        chunksize : int, default is 100000
+            Maximum number of rows in each yielded dataframe.
+        compact : bool, default is None
+            If True, uses memory efficient dtypes. Defaults to the client
+            compact setting.
+        optional kwargs
+
+        Yields
+        ------
+        pd.DataFrame
+            One column per variable with the value texts, and a numeric
+            column with the data values.
+
+        Examples
+        --------
+        >>> tid = sbc.variable_dict(code='Tid', values=['*'])
+        >>> for chunk in sbc.data_stream('folk1a', variables=[tid], chunksize=2):
+        ...     print(chunk)
+               TID  INDHOLD
+        0  2008K1  5475791
+        1  2008K2  5482266
+        ...
+        """
+        resp = self._stream_request(table_id, variables, **kwargs)
+        with resp:
+            lines = resp.iter_lines(decode_unicode=True)
+            for df in bulk_lines_to_dfs(lines, chunksize):
+                yield self._compact(df, compact)
+
+    def data_to_csv(self, table_id, path, variables=None, chunk_bytes=1 << 16, **kwargs):
+        """Streams the data for a specific table directly to a file in the
+        BULK (semicolon separated) format without holding it in memory.
+
+        Parameters
+        ----------
+        table_id : str
+        path : str or path-like
+            Destination file.
+        variables : list, default is None
+            List of dictionaries with variable parameters.
+        chunk_bytes : int, default is 65536
+            Size of the blocks read from the response and written to file.
+        optional kwargs
+
+        Returns
+        -------
+        path
+        """
+        resp = self._stream_request(table_id, variables, **kwargs)
+        with resp, open(path, 'wb') as f:
+            for block in resp.iter_content(chunk_size=chunk_bytes):
+                f.write(block)
+        return path
+
+    def _stream_request(self, table_id, variables=None, **kwargs):
+        """
+        Submits a streaming BULK data request and returns the open response.
+        Used internally by data_stream() and data_to_csv().
+        """
+        params = dict(format='BULK', table=table_id)
+        add_list_to_dict(params, variables=variables)
+        params.update({k: v for k, v in kwargs.items() if k})
+        params.setdefault('lang', self.lang)
+        resp = self._post('data', params, stream=True)
+        resp.encoding = 'utf-8-sig'
+        return resp
+
     @staticmethod
     def variable_dict(code, values, **kw):
         """Utility method to generate dictionary for a specific
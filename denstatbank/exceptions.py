@@ -0,0 +1,67 @@
+class StatBankError(Exception):
+    """Base class of the errors raised by the StatBank clients."""
+
+
+class StatBankRequestError(StatBankError):
+    """The API answered a request with an error status.
+
+    Attributes
+    ----------
+    status_code : int
+        HTTP status code of the response.
+    message : str
+        Error message returned by the API.
+    """
+
+    def __init__(self, status_code, message):
+        super().__init__(f'{status_code}: {message}')
+        self.status_code = status_code
+        self.message = message
+
+
+class StatBankRateLimitError(StatBankRequestError):
+    """The API kept answering with 429 Too Many Requests after all retries."""
+
+
+class StatBankServerError(StatBankRequestError):
+    """The API kept answering with a 5xx status after all retries."""
+
+
+class StatBankTimeoutError(StatBankError):
+    """A request timed out after all retries."""
+
+
+class StatBankConnectionError(StatBankError):
+    """A connection to the API could not be established after all retries."""
+
+
+def request_error(status_code, message):
+    """Returns the StatBankRequestError subclass matching a status code."""
+    if status_code == 429:
+        return StatBankRateLimitError(status_code, message)
+    if status_code >= 500:
+        return StatBankServerError(status_code, message)
+    return StatBankRequestError(status_code, message)
+
+
+class StatBankValidationError(StatBankError, ValueError):
+    """A variables selection is not valid for the table, detected locally
+    before any request is sent."""
+
+
+class StatBankCellLimitError(StatBankValidationError):
+    """A variables selection selects more cells than allowed.
+
+    Attributes
+    ----------
+    cells : int
+        Number of cells selected.
+    max_cells : int
+        The limit that was exceeded.
+    """
+
+    def __init__(self, cells, max_cells):
+        super().__init__(f'The selection has {cells} cells, which exceeds '
+                         f'the limit of {max_cells}.')
+        self.cells = cells
+        self.max_cells = max_cells
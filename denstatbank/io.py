@@ -0,0 +1,255 @@
+import json
+from .utils import (dataset_metadata, _category_codes, _dense_values,
+                    _dense_status)
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+
+# Key of the denstatbank metadata in the Arrow schema metadata.
+METADATA_KEY = b'denstatbank'
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('Arrow and Parquet export requires pyarrow: '
+                          'pip install pyarrow')
+
+
+def _require_polars():
+    try:
+        import polars
+    except ImportError:
+        raise ImportError('The polars backend requires polars: '
+                          'pip install polars') from None
+    return polars
+
+
+def dataset_to_arrow(ddict, codes=None, all_dims=False):
+    """Builds an Arrow table straight from a JSON-stat dataset, without an
+    intermediate dataframe.
+
+    Dimension columns are dictionary encoded, with the category labels as
+    dictionary and int32 indices computed from the 'size' array, and the
+    values are a single float64 buffer. The columns and the schema
+    metadata are those written by df_to_arrow(), so arrow_to_df() turns
+    the table into the dataframe data_dict_to_df() would return.
+
+    Parameters
+    ----------
+    ddict : dict
+        The 'dataset' part of a JSON-stat data response.
+    codes : list, default is None
+        Key codes of the dimensions to include as columns.
+    all_dims : bool, default is False
+        If True, every dimension of the dataset is included.
+
+    Returns
+    -------
+    pyarrow.Table
+    """
+    _require_pyarrow()
+    import numpy as np
+    dimension = ddict['dimension']
+    ids = dimension['id']
+    sizes = [int(n) for n in dimension['size']]
+    n = int(np.prod(sizes, dtype=np.int64))
+    codes = [c.lower() for c in codes or []]
+    arrays, names, label_codes = [], [], {}
+    for i, k in enumerate(ids):
+        if not (all_dims or k.lower() in codes):
+            continue
+        category = dimension[k]['category']
+        labels, cat_codes = category['label'], _category_codes(category)
+        dictionary = {}
+        level = np.array([dictionary.setdefault(labels[c], len(dictionary))
+                          for c in cat_codes], dtype=np.int32)
+        inner = int(np.prod(sizes[i + 1:], dtype=np.int64))
+        outer = int(np.prod(sizes[:i], dtype=np.int64))
+        arrays.append(pa.DictionaryArray.from_arrays(
+            np.tile(np.repeat(level, inner), outer),
+            pa.array(list(dictionary), type=pa.string())))
+        names.append(k.lower())
+        label_codes[k.lower()] = {labels[c]: c for c in reversed(cat_codes)}
+    index_names = list(names)
+    arrays.append(pa.array(_dense_values(ddict['value'], n)))
+    names.append(ddict['label'])
+    if ddict.get('status') is not None:
+        arrays.append(pa.array(_dense_status(ddict['status'], n), type=pa.string()))
+        names.append('status')
+    meta = {'index': index_names,
+            'attrs': dict(dataset_metadata(ddict), codes=label_codes)}
+    return pa.Table.from_arrays(
+        arrays, names=names,
+        metadata={METADATA_KEY: json.dumps(meta, default=str).encode('utf-8')})
+
+
+def dataset_to_polars(ddict, codes=None, all_dims=False):
+    """Builds a polars DataFrame from a JSON-stat dataset through
+    dataset_to_arrow(), so dimension columns become categoricals without
+    copying the values."""
+    return _require_polars().from_arrow(dataset_to_arrow(ddict, codes, all_dims))
+
+
+def records_to_arrow(records):
+    """Builds an Arrow table from a list of dicts, e.g. a tables()
+    response."""
+    _require_pyarrow()
+    return pa.Table.from_pylist(records)
+
+
+def variables_to_arrow(varlist, lang):
+    """Builds an Arrow table of variable values from the 'variables' list
+    of a tableinfo response, with the columns of variables_to_df() and a
+    dictionary encoded 'variable' column."""
+    _require_pyarrow()
+    import numpy as np
+    names, positions, ids, texts = [], [], [], []
+    for n, d in enumerate(varlist):
+        values = d['values']
+        names.append(d['text'] if lang == 'en' else d['id'])
+        positions.extend([n] * len(values))
+        ids.extend(v['id'] for v in values)
+        texts.extend(v['text'] for v in values)
+    variable = pa.DictionaryArray.from_arrays(
+        np.array(positions, dtype=np.int32), pa.array(names, type=pa.string()))
+    return pa.Table.from_arrays([variable, pa.array(ids, type=pa.string()),
+                                 pa.array(texts, type=pa.string())],
+                                names=['variable', 'id', 'text'])
+
+
+def df_to_arrow(df):
+    """Converts a dataframe returned by the client to an Arrow table.
+
+    The index levels become dictionary encoded columns built directly from
+    the levels and codes of the index, so labels are stored once per
+    level. The attrs of the dataframe (dataset label, updated timestamp,
+    units) and the names of the index levels are kept in the schema
+    metadata.
+    """
+    _require_pyarrow()
+    import pandas as pd
+    index = df.index
+    multi = isinstance(index, pd.MultiIndex)
+    index_names = []
+    arrays, names = [], []
+    if multi or index.name is not None:
+        mi = index if isinstance(index, pd.MultiIndex) else pd.MultiIndex.from_arrays([index])
+        for name, level, codes in zip(mi.names, mi.levels, mi.codes):
+            dictionary = pa.array(level.astype(str).to_numpy(dtype=object), type=pa.string())
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int32()),
+                                                         dictionary))
+            names.append(name)
+            index_names.append(name)
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(series.cat.codes.to_numpy(), type=pa.int32()),
+                pa.array(series.cat.categories.astype(str).to_numpy(dtype=object))))
+        else:
+            arrays.append(pa.Array.from_pandas(series))
+        names.append(str(col))
+    meta = {'index': index_names, 'multi': multi, 'attrs': df.attrs}
+    return pa.Table.from_arrays(
+        arrays, names=names,
+        metadata={METADATA_KEY: json.dumps(meta, default=str).encode('utf-8')})
+
+
+def arrow_to_df(table):
+    """Converts an Arrow table written by df_to_arrow() back to a dataframe,
+    restoring the index and attrs. Dictionary encoded index columns become
+    index levels without decoding each row. The index is a MultiIndex,
+    even with a single level as built by data(), unless it was a plain
+    index when written."""
+    _require_pyarrow()
+    import pandas as pd
+    meta = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b'{}'))
+    index_names = meta.get('index', [])
+    levels, codes = [], []
+    for name in index_names:
+        column = table.column(name).combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            levels.append(pd.Index(column.dictionary.to_pandas()))
+            codes.append(column.indices.to_numpy(zero_copy_only=False))
+        else:
+            level_codes, level = pd.factorize(column.to_pandas())
+            levels.append(level)
+            codes.append(level_codes)
+    df = table.drop_columns(index_names).to_pandas()
+    if index_names:
+        df.index = pd.MultiIndex(levels=levels, codes=codes, names=index_names,
+                                 verify_integrity=False)
+        if len(index_names) == 1 and not meta.get('multi', True):
+            df.index = df.index.get_level_values(0)
+    df.attrs.update(meta.get('attrs', {}))
+    return df
+
+
+def to_parquet(df, path, **kwargs):
+    """Writes a dataframe returned by the client to a Parquet file, with
+    dictionary encoded dimension columns and the dataset metadata.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    path : str or path-like
+    kwargs
+        Passed on to pyarrow.parquet.write_table, e.g. compression.
+    """
+    _require_pyarrow()
+    pq.write_table(df_to_arrow(df), path, **kwargs)
+
+
+def read_parquet(path, memory_map=True):
+    """Reads a Parquet file written by to_parquet() into a dataframe.
+
+    Parameters
+    ----------
+    path : str or path-like
+    memory_map : bool, default is True
+        If True, the file is memory mapped instead of read into a buffer.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    _require_pyarrow()
+    return arrow_to_df(pq.read_table(path, memory_map=memory_map))
+
+
+def to_arrow(df, path):
+    """Writes a dataframe returned by the client to an uncompressed Arrow
+    IPC (Feather v2) file, which can be memory mapped by read_arrow()."""
+    table = df_to_arrow(df)
+    with pa.OSFile(str(path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_arrow(path, as_table=False):
+    """Reads an Arrow IPC file written by to_arrow() by memory mapping it.
+
+    The Arrow table references the mapped pages directly, so several
+    processes reading the same file share one copy of it in the page
+    cache.
+
+    Parameters
+    ----------
+    path : str or path-like
+    as_table : bool, default is False
+        If True, returns the zero-copy pyarrow.Table, otherwise a dataframe.
+
+    Returns
+    -------
+    pd.DataFrame or pyarrow.Table
+    """
+    _require_pyarrow()
+    source = pa.memory_map(str(path), 'r')
+    table = pa.ipc.open_file(source).read_all()
+    if as_table:
+        return table
+    return arrow_to_df(table)
@@ -0,0 +1,165 @@
+import bisect
+import threading
+from collections import defaultdict, deque
+
+# Upper bounds of the histogram buckets for durations in seconds.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Upper bounds of the histogram buckets for sizes in bytes, 256 B to 1 GiB.
+BYTES_BUCKETS = tuple(2 ** k for k in range(8, 31, 2))
+
+# Upper bounds of the histogram buckets for numbers of cells.
+CELLS_BUCKETS = tuple(10 ** k for k in range(8))
+
+# Histogram buckets of the measurements that are not durations.
+BUCKETS = {'request_bytes': BYTES_BUCKETS, 'response_bytes': BYTES_BUCKETS,
+           'response_cells': CELLS_BUCKETS}
+
+
+class MetricsSink:
+    """Receives the measurements of a client. This base class ignores them.
+
+    Subclass it to forward measurements to Prometheus, OpenTelemetry or
+    any other system: observe() maps to a histogram and increment() to a
+    counter, and the labels are passed as keyword arguments.
+
+    Measurements
+    ------------
+    request_seconds (endpoint)
+        Duration of each HTTP attempt, including reading the body.
+    server_seconds (endpoint)
+        Time until the response headers arrived.
+    request_bytes, response_bytes (endpoint)
+        Size of the request and response bodies.
+    decode_seconds (endpoint)
+        Time spent decoding JSON.
+    convert_seconds (method)
+        Time spent building dataframes.
+    response_cells (endpoint)
+        Number of cells in data responses.
+    retries (endpoint, reason), errors (endpoint, reason)
+        Counters of retried and failed requests.
+    cache_hits, cache_misses (cache)
+        Counters of cache lookups.
+
+    Examples
+    --------
+    >>> from prometheus_client import Histogram, Counter
+    >>> class PrometheusMetrics(MetricsSink):
+    ...     def observe(self, name, value, **labels):
+    ...         histograms[name].labels(**labels).observe(value)
+    ...     def increment(self, name, value=1, **labels):
+    ...         counters[name].labels(**labels).inc(value)
+    """
+
+    def observe(self, name, value, **labels):
+        """Records a measured value, e.g. a duration or a size."""
+
+    def increment(self, name, value=1, **labels):
+        """Increments a counter."""
+
+
+class InMemoryMetrics(MetricsSink):
+    """Thread-safe sink that keeps the measurements in memory so that they
+    can be inspected programmatically, e.g. to adapt concurrency to the
+    observed latencies.
+
+    Attributes
+    ----------
+    window : int, default is 1000
+        Number of recent values kept per measurement for quantiles. Counts,
+        sums and histogram buckets cover all values.
+    buckets : dict, default is None
+        Upper bounds of the histogram buckets per measurement name, added
+        to BUCKETS. Measurements without buckets use SECONDS_BUCKETS.
+
+    Examples
+    --------
+    >>> metrics = InMemoryMetrics()
+    >>> sbc = StatBankClient(metrics=metrics)
+    >>> df = sbc.data('folk1a')
+    >>> metrics.quantile('request_seconds', 0.95, endpoint='data')
+    0.21
+    >>> metrics.summary()['request_seconds{endpoint=data}']['count']
+    1
+    """
+
+    def __init__(self, window=1000, buckets=None):
+        self.window = window
+        self.buckets = {name: tuple(bounds)
+                        for name, bounds in dict(BUCKETS, **(buckets or {})).items()}
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))
+        self._count = defaultdict(int)
+        self._sum = defaultdict(float)
+        self._histograms = {}
+        self._counters = defaultdict(float)
+
+    def bounds(self, name):
+        """Upper bounds of the histogram buckets of a measurement."""
+        return self.buckets.get(name, SECONDS_BUCKETS)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._recent[key].append(value)
+            self._count[key] += 1
+            self._sum[key] += value
+            bounds = self.bounds(name)
+            counts = self._histograms.setdefault(key, [0] * (len(bounds) + 1))
+            counts[bisect.bisect_left(bounds, value)] += 1
+
+    def increment(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def counter(self, name, **labels):
+        """Value of a counter."""
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def values(self, name, **labels):
+        """Recent values of a measurement, oldest first."""
+        with self._lock:
+            return list(self._recent.get(self._key(name, labels), ()))
+
+    def quantile(self, name, q, **labels):
+        """Quantile q of the recent values of a measurement, or None."""
+        values = sorted(self.values(name, **labels))
+        if values:
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+    def histogram(self, name, **labels):
+        """Bucket counts of a measurement as {upper bound: count}, with the
+        last bucket under float('inf')."""
+        bounds = self.bounds(name)
+        with self._lock:
+            counts = list(self._histograms.get(self._key(name, labels),
+                                               [0] * (len(bounds) + 1)))
+        return dict(zip(bounds + (float('inf'),), counts))
+
+    def summary(self):
+        """All measurements and counters as a dict keyed by name{labels}."""
+        def fmt(key):
+            name, labels = key
+            if not labels:
+                return name
+            return name + '{' + ','.join(f'{k}={v}' for k, v in labels) + '}'
+        with self._lock:
+            out = {fmt(k): {'count': self._count[k], 'sum': self._sum[k],
+                            'mean': self._sum[k] / self._count[k],
+                            'max': max(self._recent[k])}
+                   for k in self._count}
+            out.update({fmt(k): v for k, v in self._counters.items()})
+        return out
+
+    def reset(self):
+        """Forgets all measurements."""
+        with self._lock:
+            for d in (self._recent, self._count, self._sum, self._histograms,
+                      self._counters):
+                d.clear()
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from .denstatbank import MAX_CELLS
+from .io import dataset_to_arrow, _require_pyarrow
+
+# Name of the manifest file at the root of a mirror.
+MANIFEST = 'manifest.json'
+
+# Extension of the data files of each format.
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _write_atomic(path, write):
+    """Writes a file through a temporary file, so that an interrupted run
+    never leaves a partial file behind."""
+    tmp = f'{path}.tmp'
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_table(table, path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if fmt == 'parquet':
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+def read_manifest(path):
+    """Returns the manifest of a mirror, or an empty one."""
+    try:
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'tables': {}}
+
+
+class Mirror:
+    """Local copy of StatBank tables, stored as one columnar data file and
+    one tableinfo() JSON file per table, plus a manifest.
+
+    The manifest records the 'updated' timestamp, language, files and
+    number of cells of every table written. It is saved after each table,
+    so an interrupted run resumes where it stopped, and tables whose
+    'updated' timestamp has not changed since they were written are
+    skipped.
+
+    Layout::
+
+        path/manifest.json
+        path/metadata/<TABLE>.json
+        path/data/<TABLE>.parquet
+
+    Attributes
+    ----------
+    client : StatBankClient
+        Client used for the requests. Its rate_limit applies to all the
+        requests of the mirror.
+    path : str or path-like
+        Root directory of the mirror. Created if it does not exist.
+    fmt : str, {'parquet', 'arrow'} default is 'parquet'
+        Format of the data files. Both require pyarrow.
+    max_cells : int, default is MAX_CELLS
+        Larger tables are requested in several parts, see data().
+
+    Examples
+    --------
+    >>> sbc = StatBankClient(lang='en', rate_limit=5)
+    >>> result = Mirror(sbc, '~/statbank').run(max_workers=8)
+    >>> result['failed']
+    {}
+    """
+
+    def __init__(self, client, path, fmt='parquet', max_cells=MAX_CELLS):
+        _require_pyarrow()
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown format {fmt!r}, use one of {list(FORMATS)}.')
+        self.client = client
+        self.path = os.path.expanduser(str(path))
+        self.fmt = fmt
+        self.max_cells = max_cells
+        self.manifest = read_manifest(self.path)
+        self._lock = threading.Lock()
+
+    def _save_manifest(self):
+        def write(tmp):
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        _write_atomic(os.path.join(self.path, MANIFEST), write)
+
+    def is_current(self, table):
+        """Whether a tables() row is in the mirror with the same 'updated'
+        timestamp and language."""
+        entry = self.manifest['tables'].get(table['id'].upper())
+        return (entry is not None and entry['updated'] == table['updated']
+                and entry['lang'] == self.client.lang
+                and entry['format'] == self.fmt
+                and os.path.exists(os.path.join(self.path, entry['data'])))
+
+    def fetch(self, table):
+        """Writes the metadata and all the data of a table to the mirror and
+        records it in the manifest. Returns the manifest entry."""
+        table_id = table['id'].upper()
+        client = self.client
+        # data() reuses the lookup to split the selection, so the table
+        # metadata is only requested once.
+        info = client.lookup(table_id, updated=table['updated']).info
+        variables = [client.variable_dict(v['id'], ['*']) for v in info['variables']]
+        resp = client.data(table_id, as_df=False, variables=variables,
+                           max_cells=self.max_cells)
+        arrow = dataset_to_arrow(resp['dataset'], all_dims=True)
+        entry = {'updated': table['updated'], 'lang': client.lang,
+                 'format': self.fmt,
+                 'metadata': os.path.join('metadata', f'{table_id}.json'),
+                 'data': os.path.join('data', f'{table_id}{FORMATS[self.fmt]}'),
+                 'cells': arrow.num_rows,
+                 'fetched': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+
+        def write_info(tmp):
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False)
+        _write_atomic(os.path.join(self.path, entry['metadata']), write_info)
+        _write_atomic(os.path.join(self.path, entry['data']),
+                      lambda tmp: _write_table(arrow, tmp, self.fmt))
+        with self._lock:
+            self.manifest['tables'][table_id] = entry
+            self._save_manifest()
+        return entry
+
+    def run(self, tables=None, include_inactive=False, max_workers=4,
+            progress=None):
+        """Brings the mirror up to date.
+
+        Parameters
+        ----------
+        tables : list of str, default is None
+            Ids of the tables to mirror. All tables by default.
+        include_inactive : bool, default is False
+            If True, tables that are no longer updated are mirrored too.
+        max_workers : int, default is 4
+            Number of tables fetched concurrently.
+        progress : callable, default is None
+            Called with (table_id, status, detail) after each table, where
+            status is 'fetched', 'skipped' or 'failed'.
+
+        Returns
+        -------
+        dict with the lists of 'fetched' and 'skipped' table ids and the
+        'failed' table ids mapped to their error.
+        """
+        for sub in ('metadata', 'data'):
+            os.makedirs(os.path.join(self.path, sub), exist_ok=True)
+        listed = self.client.tables(include_inactive=include_inactive,
+                                    as_df=False, backend='raw')
+        if tables is not None:
+            wanted = {t.upper() for t in tables}
+            listed = [t for t in listed if t['id'].upper() in wanted]
+        result = {'fetched': [], 'skipped': [], 'failed': {}}
+        todo = []
+        for t in listed:
+            if self.is_current(t):
+                result['skipped'].append(t['id'].upper())
+                if progress is not None:
+                    progress(t['id'].upper(), 'skipped', None)
+            else:
+                todo.append(t)
+
+        def work(table):
+            table_id = table['id'].upper()
+            try:
+                entry = self.fetch(table)
+            except Exception as ex:
+                with self._lock:
+                    result['failed'][table_id] = str(ex)
+                status, detail = 'failed', ex
+            else:
+                with self._lock:
+                    result['fetched'].append(table_id)
+                status, detail = 'fetched', entry
+            if progress is not None:
+                progress(table_id, status, detail)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(work, todo))
+        return result
+
+
+def mirror(client, path, tables=None, include_inactive=False, max_workers=4,
+           fmt='parquet', max_cells=MAX_CELLS, progress=None):
+    """Mirrors StatBank tables to a local directory, see Mirror.
+
+    Returns
+    -------
+    dict with the 'fetched', 'skipped' and 'failed' tables.
+    """
+    return Mirror(client, path, fmt=fmt, max_cells=max_cells).run(
+        tables=tables, include_inactive=include_inactive,
+        max_workers=max_workers, progress=progress)
@@ -0,0 +1,202 @@
+import bisect
+import json
+import re
+from collections import defaultdict
+
+_TOKEN = re.compile(r'\w+')
+
+# Common Danish and English inflection suffixes, longest first.
+_SUFFIXES = sorted(['erne', 'ernes', 'ene', 'enes', 'ets', 'et', 'en', 'ens',
+                    'er', 'ers', 'e', 'es', 's', 'ies', 'ing', 'ings', 'ed',
+                    'ion', 'ions', 'ning', 'ninger', 'ningen', 'ningerne',
+                    'else', 'elser', 'elsen'], key=len, reverse=True)
+
+# Suffixes replaced rather than stripped, so that e.g. 'countries' and
+# 'country' share a stem.
+_REPLACEMENTS = {'ies': 'y'}
+
+# Weight of a match in each field of a table.
+FIELD_WEIGHTS = {'id': 4, 'text': 3, 'variables': 2, 'subjects': 1}
+
+
+def stem(token):
+    """Light stemmer stripping the most common Danish and English suffixes
+    from a lower case token, keeping at least three characters."""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + _REPLACEMENTS.get(suffix, '')
+    return token
+
+
+def tokenize(text):
+    """Splits a text into stemmed lower case tokens."""
+    return [stem(t) for t in _TOKEN.findall(str(text).lower())]
+
+
+def index_terms(text):
+    """Terms indexed for a text: its lower case tokens and their stems."""
+    tokens = _TOKEN.findall(str(text).lower())
+    return set(tokens) | {stem(t) for t in tokens}
+
+
+class TableIndex:
+    """In-memory search index over the tables of the StatBank database.
+
+    Table ids, texts, variable names and subject paths are tokenized into
+    an inverted index of the lower case tokens and their stems, so that
+    searches are dictionary and binary search lookups that never touch the
+    API. Each query token matches the indexed terms starting with it or
+    with its stem, so partly typed words match the full words
+    (search-as-you-type) and complete words match their inflections.
+
+    Examples
+    --------
+    >>> index = TableIndex.build(sbc)
+    >>> index.search('befolkning kvartal')[0]['id']
+    'FOLK1A'
+    >>> index.save('tables.json')
+    >>> index = TableIndex.load('tables.json')
+    >>> index.update(sbc, past_days=1)
+    """
+
+    def __init__(self, tables=None, lang=None):
+        self.lang = lang
+        self.tables = {}
+        self._postings = defaultdict(dict)
+        self._terms = None
+        for table in (tables or {}).values():
+            self.add(table)
+
+    @classmethod
+    def build(cls, client, include_inactive=False):
+        """Builds the index from one tables() and one recursive subjects()
+        request, in the language of the client."""
+        tables = client.tables(include_inactive=include_inactive, as_df=False)
+        subjects = client.subjects(recursive=True, include_tables=True,
+                                   as_tree=False)
+        paths = subject_paths(subjects)
+        index = cls(lang=client.lang)
+        for t in tables:
+            index.add(dict(t, subjects=paths.get(t['id'], [])))
+        return index
+
+    def update(self, client, past_days=1):
+        """Reindexes the tables updated in the last past_days days.
+
+        Returns
+        -------
+        int, the number of tables reindexed.
+        """
+        tables = client.tables(past_days=past_days, include_inactive=True,
+                               as_df=False)
+        for t in tables:
+            old = self.tables.get(t['id'], {})
+            self.add(dict(t, subjects=old.get('subjects', [])))
+        return len(tables)
+
+    def add(self, table):
+        """Adds a table (a tables() row with an optional 'subjects' path) to
+        the index, replacing a previous version of it."""
+        table_id = table['id']
+        if table_id in self.tables:
+            self.remove(table_id)
+        self.tables[table_id] = table
+        for field, weight in FIELD_WEIGHTS.items():
+            value = table.get(field) or ''
+            text = ' '.join(value) if isinstance(value, list) else value
+            for token in index_terms(text):
+                postings = self._postings[token]
+                postings[table_id] = max(postings.get(table_id, 0), weight)
+        self._terms = None
+
+    def remove(self, table_id):
+        """Removes a table from the index."""
+        self.tables.pop(table_id, None)
+        for token in [t for t, p in self._postings.items() if table_id in p]:
+            del self._postings[token][table_id]
+            if not self._postings[token]:
+                del self._postings[token]
+        self._terms = None
+
+    def _matches(self, token):
+        """Table ids and weights of the indexed terms starting with a query
+        token or with its stem."""
+        if self._terms is None:
+            self._terms = sorted(self._postings)
+        matches = {}
+        for prefix in {token, stem(token)}:
+            start = bisect.bisect_left(self._terms, prefix)
+            for term in self._terms[start:]:
+                if not term.startswith(prefix):
+                    break
+                exact = 1 if term == prefix else 0
+                for table_id, weight in self._postings[term].items():
+                    matches[table_id] = max(matches.get(table_id, 0), weight + exact)
+        return matches
+
+    def search(self, query, limit=20, active_only=False):
+        """Returns the tables matching every token of the query.
+
+        Parameters
+        ----------
+        query : str
+        limit : int, default is 20
+            Maximum number of results.
+        active_only : bool, default is False
+            If True, inactive tables are left out.
+
+        Returns
+        -------
+        list of dicts with the table 'id', 'text', 'subjects' path and
+        match 'score', best match first.
+        """
+        scores = None
+        for token in _TOKEN.findall(str(query).lower()):
+            matches = self._matches(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {k: v + matches[k] for k, v in scores.items()
+                          if k in matches}
+        if not scores:
+            return []
+        hits = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        results = []
+        for table_id, score in hits:
+            table = self.tables[table_id]
+            if active_only and not table.get('active', True):
+                continue
+            results.append({'id': table_id, 'text': table.get('text'),
+                            'subjects': table.get('subjects', []),
+                            'score': score})
+            if len(results) == limit:
+                break
+        return results
+
+    def save(self, path):
+        """Saves the indexed tables to a JSON file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'lang': self.lang, 'tables': self.tables}, f,
+                      ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """Loads an index saved with save()."""
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        return cls(saved['tables'], lang=saved.get('lang'))
+
+
+def subject_paths(subjects):
+    """Maps table ids to the list of subject descriptions leading to them,
+    from a subjects(recursive=True, include_tables=True) response."""
+    paths = {}
+    stack = [(d, []) for d in reversed(subjects or [])]
+    while stack:
+        node, path = stack.pop()
+        path = path + [node.get('description', node.get('text', ''))]
+        for t in node.get('tables') or []:
+            paths.setdefault(t['id'], path)
+        for child in reversed(node.get('subjects') or []):
+            stack.append((child, path))
+    return paths
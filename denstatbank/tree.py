@@ -0,0 +1,141 @@
+class SubjectNode:
+    """A subject or table in the subject hierarchy of the StatBank database.
+
+    Attributes
+    ----------
+    id : str
+        Subject id (numeric) or table id (alphanumeric).
+    text : str
+        Subject description or table text.
+    is_table : bool
+    parent : SubjectNode or None
+    children : list of SubjectNode
+    has_subjects : bool
+        Whether the API reports sub-subjects for this subject.
+    expanded : bool
+        Whether the children of the node have been loaded.
+    """
+
+    __slots__ = ('id', 'text', 'is_table', 'parent', 'children',
+                 'has_subjects', 'expanded')
+
+    def __init__(self, id, text, is_table=False, parent=None,
+                 has_subjects=False, expanded=False):
+        self.id = id
+        self.text = text
+        self.is_table = is_table
+        self.parent = parent
+        self.children = []
+        self.has_subjects = has_subjects
+        self.expanded = expanded
+
+    def __repr__(self):
+        return f'SubjectNode({self.id!r}, {self.text!r})'
+
+    def ancestors(self):
+        """Nodes from the top level subject down to the parent of this node."""
+        chain = []
+        node = self.parent
+        while node is not None and node.id is not None:
+            chain.append(node)
+            node = node.parent
+        return chain[::-1]
+
+
+class SubjectTree:
+    """Tree of subjects and tables built from subjects() responses.
+
+    The tree can be built from a complete recursive response, or lazily:
+    only the top level is fetched up front and each subject is expanded on
+    demand with a single subjects([id], include_tables=True) request.
+    Nodes are also indexed by id, so finding a table and the chain of
+    subjects above it does not walk the tree.
+
+    Examples
+    --------
+    >>> tree = sbc.subject_tree()            # top level only
+    >>> tree.expand('02')                    # one more level below '02'
+    >>> tree = sbc.subject_tree(lazy=False)  # the whole tree
+    >>> [n.text for n in tree.path('FOLK1A')]
+    ['Population and elections', 'Population and population projections',
+     'Population in Denmark']
+    """
+
+    def __init__(self, client=None, include_tables=True):
+        self.client = client
+        self.include_tables = include_tables
+        self.root = SubjectNode(None, None, expanded=True)
+        self.nodes = {}
+
+    @classmethod
+    def from_response(cls, resp, client=None, include_tables=True):
+        """Builds a tree from a subjects(as_tree=False) response."""
+        tree = cls(client, include_tables)
+        tree._attach(tree.root, resp)
+        return tree
+
+    def _attach(self, parent, items):
+        """Adds the subjects (and their sub-subjects and tables) in items as
+        children of parent, iteratively in a single pass."""
+        stack = [(parent, items)]
+        while stack:
+            parent, items = stack.pop()
+            for d in items:
+                is_table = 'text' in d and 'description' not in d
+                node = SubjectNode(d['id'], d.get('description', d.get('text')),
+                                   is_table=is_table, parent=parent,
+                                   has_subjects=d.get('hasSubjects', False))
+                parent.children.append(node)
+                self.nodes[node.id] = node
+                subjects, tables = d.get('subjects') or [], d.get('tables') or []
+                node.expanded = is_table or bool(subjects or tables) or (
+                    not node.has_subjects and 'tables' in d)
+                if subjects or tables:
+                    stack.append((node, list(subjects) + list(tables)))
+
+    def __getitem__(self, node_id):
+        return self.nodes[node_id]
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def expand(self, node):
+        """Loads the children of a subject (node or id) from the API if they
+        have not been loaded yet, and returns them."""
+        if not isinstance(node, SubjectNode):
+            node = self.nodes[node]
+        if not node.expanded:
+            resp = self.client.subjects(subjects=[node.id],
+                                        include_tables=self.include_tables,
+                                        as_tree=False)
+            for d in resp:
+                children = (d.get('subjects') or []) + (d.get('tables') or [])
+                self._attach(node, children)
+            node.expanded = True
+        return node.children
+
+    def walk(self, expand=False):
+        """Yields (depth, node) for all nodes in depth first order, expanding
+        unloaded subjects on the way if expand is True."""
+        stack = [(c, 0) for c in reversed(self.root.children)]
+        while stack:
+            node, depth = stack.pop()
+            yield depth, node
+            children = self.expand(node) if expand else node.children
+            stack.extend((c, depth + 1) for c in reversed(children))
+
+    def path(self, node_id):
+        """The chain of subject nodes above a table or subject id, or None
+        if the id is not (yet) in the tree."""
+        node = self.nodes.get(node_id)
+        if node is not None:
+            return node.ancestors()
+
+    def tables(self):
+        """All table nodes loaded in the tree."""
+        return [n for n in self.nodes.values() if n.is_table]
+
+    def lines(self):
+        """Yields the lines of the printed tree, as subjects() prints it."""
+        for depth, node in self.walk():
+            yield '\t |  ' * depth + f'\t |--{(node.id, node.text)}'
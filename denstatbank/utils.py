@@ -1,20 +1,627 @@
-import pandas as pd
+import csv
+import fnmatch
+import json
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from .exceptions import StatBankValidationError
 
 
-def data_dict_to_df(ddict, codes):
-    """Augments a simple pandas dataframe to a multi-indexed dataframe from a
-    list of key codes.
+def data_dict_to_df(ddict, codes=None, all_dims=False, parse_time=False):
+    """Converts a JSON-stat dataset to a (multi-indexed) pandas dataframe.
+
+    The index is built directly from the integer positions implied by the
+    'id' and 'size' arrays of the dataset, with the category labels as
+    levels, and the values are parsed into a single float64 array. Both
+    the dense (list) and sparse (dict) forms of 'value' and 'status' are
+    supported. A 'status' column is added when the dataset has a status.
+    The dataset label, source, updated timestamp, units, dimension ids and
+    dimension labels are stored in the attrs of the dataframe, together
+    with the category code of each index label under 'codes', see
+    relabel_df().
+
+    Parameters
+    ----------
+    ddict : dict
+        The 'dataset' part of a JSON-stat data response.
+    codes : list, default is None
+        Key codes (lower case) of the dimensions to include in the index.
+    all_dims : bool, default is False
+        If True, every dimension of the dataset is included in the index.
+    parse_time : bool, default is False
+        If True, the time dimension becomes a PeriodIndex level, see
+        parse_periods(). It is left as it is if its codes are not periods.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    import numpy as np
+    import pandas as pd
+    dimension = ddict['dimension']
+    ids = dimension['id']
+    time_ids = (dimension.get('role') or {}).get('time') or [
+        k for k in ids if k.lower() == 'tid']
+    sizes = [int(n) for n in dimension['size']]
+    n = int(np.prod(sizes, dtype=np.int64))
+    df = pd.DataFrame({ddict['label']: _dense_values(ddict['value'], n)})
+    if ddict.get('status') is not None:
+        df['status'] = _dense_status(ddict['status'], n)
+    codes = [c.lower() for c in codes or []]
+    keys = [i for i, k in enumerate(ids) if all_dims or k.lower() in codes]
+    label_codes = {}
+    if keys:
+        levels, level_codes = [], []
+        for i in keys:
+            category = dimension[ids[i]]['category']
+            periods = None
+            if parse_time and ids[i] in time_ids:
+                periods = parse_periods(tuple(_category_codes(category)))
+            if periods is not None:
+                level, cat_codes = periods, np.arange(len(periods))
+            else:
+                level, cat_codes = _dimension_level(category)
+                labels = category['label']
+                label_codes[ids[i].lower()] = {
+                    labels[c]: c for c in reversed(_category_codes(category))}
+            inner = int(np.prod(sizes[i + 1:], dtype=np.int64))
+            outer = int(np.prod(sizes[:i], dtype=np.int64))
+            positions = np.tile(np.repeat(np.arange(sizes[i]), inner), outer)
+            levels.append(level)
+            level_codes.append(cat_codes[positions])
+        df.index = pd.MultiIndex(levels=levels, codes=level_codes,
+                                 names=[ids[i].lower() for i in keys],
+                                 verify_integrity=False)
+    df.attrs.update(dataset_metadata(ddict), codes=label_codes)
+    return df
+
+
+def dataset_metadata(ddict):
+    """Returns the label, source, updated timestamp, units, dimension ids
+    and dimension labels of a JSON-stat dataset, as stored in the attrs of
+    the dataframes built from it."""
+    dimension = ddict['dimension']
+    units = {}
+    for k in dimension['id']:
+        units.update(dimension[k]['category'].get('unit') or {})
+    return {'label': ddict.get('label'), 'source': ddict.get('source'),
+            'updated': ddict.get('updated'), 'units': units,
+            'dimensions': list(dimension['id']),
+            'dimension_labels': {k: dimension[k].get('label', k)
+                                 for k in dimension['id']}}
+
+
+def dataset_label(text, variables, lang):
+    """Label of a dataset as the API writes it, e.g. 'Population by sex,
+    age and time', from the table text and the texts of its variables."""
+    by, and_ = ('by', 'and') if lang == 'en' else ('efter', 'og')
+    if len(variables) > 1:
+        variables = [', '.join(variables[:-1]) + f' {and_} ' + variables[-1]]
+    return f'{text} {by} {variables[0]}' if variables else text
+
+
+def relabel_df(df, lookup, text=None):
+    """Translates the index labels of a dataframe built by data_dict_to_df()
+    into the language of a ValueLookup.
+
+    The category codes stored in df.attrs['codes'] are mapped to the texts
+    of the lookup once per index level, so the rows and the values are not
+    touched. Time levels parsed into periods are kept as they are. The
+    ContentsCode level (see data(all_dims=True)) is not a variable of
+    tableinfo(); a content named after the table takes the table text, and
+    other contents keep the labels of the response.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        A dataframe returned by data().
+    lookup : ValueLookup
+        Lookups of the table in the target language.
+    text : str, default is None
+        Table text in the target language. If given, the value column and
+        the 'label' attr are renamed after the translated dataset label.
+
+    Returns
+    -------
+    pd.DataFrame sharing the data of df.
+    """
+    import pandas as pd
+    codes = df.attrs.get('codes')
+    if codes is None:
+        raise ValueError('The dataframe has no category codes in its attrs, '
+                         'only dataframes returned by data() can be relabeled.')
+    index = df.index
+    multi = isinstance(index, pd.MultiIndex)
+    levels = list(index.levels) if multi else [index]
+    new_levels, new_codes = [], {}
+    for name, level in zip(index.names, levels):
+        mapping = codes.get(name)
+        if mapping is None or isinstance(level, pd.PeriodIndex):
+            new_levels.append(level)
+            continue
+        texts = lookup.code_to_text.get(lookup._variables.get(name))
+        if texts is None:
+            texts = {}
+            if name == 'contentscode' and lookup.table_id:
+                texts = {lookup.table_id: lookup.info.get('text')}
+        labels = [texts.get(mapping.get(v), v) for v in level]
+        new_level = pd.Index(labels, name=level.name)
+        if not new_level.is_unique:
+            new_level, labels = level, list(level)
+        new_levels.append(new_level)
+        new_codes[name] = {t: mapping[v] for v, t in zip(level, labels)
+                           if v in mapping}
+    out = df.copy(deep=False)
+    if multi:
+        out.index = index.set_levels(new_levels, verify_integrity=False)
+    elif new_codes:
+        out.index = new_levels[0]
+    out.attrs = dict(df.attrs, codes=new_codes)
+    if text is not None and df.attrs.get('dimensions'):
+        # Dimensions that are not variables of tableinfo(), such as
+        # ContentsCode, keep the label of the response.
+        labels = df.attrs.get('dimension_labels') or {}
+        names = [lookup.variable_text.get(lookup._variables.get(k.lower()),
+                                          labels.get(k, k))
+                 for k in df.attrs['dimensions']]
+        label = dataset_label(text, names, lookup.lang)
+        out = out.rename(columns={df.attrs.get('label'): label})
+        out.attrs = dict(df.attrs, codes=new_codes, label=label)
+    return out
+
+
+def _dimension_level(category):
+    """Returns the index level of a JSON-stat category, and the level code
+    of each category position."""
+    import numpy as np
+    import pandas as pd
+    labels = [category['label'][code] for code in _category_codes(category)]
+    level = pd.Index(labels)
+    if level.is_unique:
+        return level, np.arange(len(labels))
+    cat_codes, level = pd.factorize(level)
+    return level, cat_codes
+
+
+# Time period codes of the API and the pandas frequency they map to.
+_PERIOD_FORMATS = [
+    ('D', re.compile(r'^(\d{4})M(\d{2})D(\d{2})$')),
+    ('M', re.compile(r'^(\d{4})M(\d{2})$')),
+    ('Q', re.compile(r'^(\d{4})[KQ]([1-4])$')),
+    ('6M', re.compile(r'^(\d{4})H([12])$')),
+    ('W', re.compile(r'^(\d{4})U(\d{2})$')),
+    ('Y', re.compile(r'^(\d{4})$')),
+]
+
+
+@lru_cache(maxsize=256)
+def parse_periods(codes):
+    """Parses time codes of the API into a PeriodIndex.
+
+    Supported formats are years ('2020'), half years ('2020H1', frequency
+    6M), quarters ('2020K1' or '2020Q1'), months ('2020M01'), ISO weeks
+    ('2020U01', weeks from Monday to Sunday) and days ('2020M01D31'). The
+    codes are matched and converted as whole arrays, and the result is
+    memoized per tuple of codes, so a time dimension is parsed once
+    however many rows and requests share it.
+
+    Parameters
+    ----------
+    codes : tuple of str
+        Time codes, all in the same format.
+
+    Returns
+    -------
+    pd.PeriodIndex, or None if the codes are not all in one of the formats.
+    """
+    import numpy as np
+    import pandas as pd
+    if not codes:
+        return None
+    for freq, regex in _PERIOD_FORMATS:
+        if regex.match(codes[0]):
+            break
+    else:
+        return None
+    fields = pd.Series(codes, dtype=object).str.extract(regex)
+    if fields.isna().any().any():
+        return None
+    fields = fields.to_numpy(dtype=np.int64)
+    years = fields[:, 0] - 1970
+    if freq == 'Y':
+        ordinals = years
+    elif freq == 'Q':
+        ordinals = years * 4 + fields[:, 1] - 1
+    elif freq == '6M':
+        ordinals = years * 12 + (fields[:, 1] - 1) * 6
+    elif freq == 'M':
+        ordinals = years * 12 + fields[:, 1] - 1
+    elif freq == 'D':
+        months = (years * 12 + fields[:, 1] - 1).astype('datetime64[M]')
+        ordinals = (months.astype('datetime64[D]').astype(np.int64)
+                    + fields[:, 2] - 1)
+    else:
+        # Monday of ISO week 1 is the Monday on or before 4 January.
+        jan4 = years.astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64) + 3
+        mondays = jan4 - (jan4 + 3) % 7 + (fields[:, 1] - 1) * 7
+        return pd.DatetimeIndex(mondays.astype('datetime64[D]')).to_period('W')
+    # PeriodIndex.from_ordinals() needs pandas 2.2, PeriodArray accepts
+    # ordinals in all supported versions.
+    return pd.PeriodIndex(pd.arrays.PeriodArray(ordinals, dtype=pd.PeriodDtype(freq)))
+
+
+def _dense_values(value, n):
+    """Parses the dense or sparse JSON-stat 'value' into a float64 array."""
+    import numpy as np
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float64, copy=False)
+    if isinstance(value, dict):
+        dense = np.full(n, np.nan)
+        if value:
+            idx = np.fromiter(map(int, value.keys()), dtype=np.intp, count=len(value))
+            dense[idx] = np.array(list(value.values()), dtype=np.float64)
+        return dense
+    return np.array(value, dtype=np.float64)
+
+
+def _dense_status(status, n):
+    """Parses the JSON-stat 'status' (string, list or dict) into an array."""
+    import numpy as np
+    dense = np.full(n, None, dtype=object)
+    if isinstance(status, dict):
+        for k, v in status.items():
+            dense[int(k)] = v
+    elif isinstance(status, list):
+        dense[:] = status
+    else:
+        dense[:] = status
+    return dense
+
+
+def compact_df(df):
+    """Returns a copy of a dataframe with memory efficient dtypes.
+
+    - 'updated' columns are parsed to datetime64
+    - repeated strings become category columns
+    - integral floats become the smallest nullable integer type that holds
+      them, other floats become float32 where that is lossless
+    - integers are downcast
+    Columns of lists and the index are left as they are; MultiIndex
+    levels are already stored once with small integer codes.
+    """
+    import pandas as pd
+    compact = pd.DataFrame({col: _compact_series(df[col], col)
+                            for col in df.columns}, index=df.index)
+    compact.columns = df.columns
+    compact.attrs.update(df.attrs)
+    return compact
+
+
+def _compact_series(s, name):
+    """Converts a series to the most compact lossless dtype."""
+    import numpy as np
+    import pandas as pd
+    if name == 'updated':
+        return pd.to_datetime(s, errors='coerce')
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    if pd.api.types.is_float_dtype(s.dtype):
+        values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = values[~np.isnan(values)]
+        if finite.size and np.array_equal(finite, np.floor(finite)):
+            for dtype in ('Int8', 'Int16', 'Int32', 'Int64'):
+                info = np.iinfo(dtype.lower())
+                if info.min <= finite.min() and finite.max() <= info.max:
+                    return s.astype(dtype)
+        as32 = values.astype(np.float32)
+        if np.array_equal(as32.astype(np.float64), values, equal_nan=True):
+            return pd.Series(as32, index=s.index, name=s.name)
+        return s
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return pd.to_numeric(s, downcast='integer')
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    first = s.dropna().iloc[0] if s.notna().any() else None
+    if isinstance(first, str) and s.nunique() <= len(s) // 2:
+        return s.astype('category')
+    return s
+
+
+def variables_to_df(varlist, lang):
+    """Builds the dataframe of variable values from the 'variables' list of
+    a tableinfo response in a single pass. The dataframe has a 'text'
+    column and a (variable, id) MultiIndex, where variables are named by
+    their text in English and by their (Danish) id otherwise.
+    """
+    import pandas as pd
+    names, ids, texts = [], [], []
+    for d in varlist:
+        values = d['values']
+        names.extend([d['text'] if lang == 'en' else d['id']] * len(values))
+        ids.extend(v['id'] for v in values)
+        texts.extend(v['text'] for v in values)
+    index = pd.MultiIndex.from_arrays([names, ids], names=['variable', 'id'])
+    return pd.DataFrame({'text': texts}, index=index)
+
+
+class ValueLookup:
+    """Code to text and text to code lookups of the variable values of a
+    table in one language, built from a tableinfo() response.
+
+    Variables are identified by their (Danish) id, case insensitively, or
+    by their text.
+
+    Attributes
+    ----------
+    lang : str
+    info : dict
+        The tableinfo() response the lookups were built from.
+    code_to_text : dict
+        {variable id: {value code: value text}}
+    text_to_code : dict
+        {variable id: {value text: value code}}
+    variable_text : dict
+        {variable id: variable text}
+    """
+
+    def __init__(self, info, lang=None):
+        self.lang = lang
+        self.info = info
+        self.table_id = info.get('id')
+        self.code_to_text, self.text_to_code, self.variable_text = {}, {}, {}
+        self._variables = {}
+        for d in info['variables']:
+            pairs = [(v['id'], v['text']) for v in d['values']]
+            self.code_to_text[d['id']] = dict(pairs)
+            self.text_to_code[d['id']] = {text: code for code, text in pairs}
+            self.variable_text[d['id']] = d['text']
+            self._variables[d['id'].lower()] = d['id']
+            self._variables.setdefault(d['text'].lower(), d['id'])
+
+    def variable(self, name):
+        """The variable id of a variable id or text."""
+        return self._variables[name.lower()]
+
+    def text(self, variable, codes):
+        """Text of a value code, or list of texts of a list of codes."""
+        mapping = self.code_to_text[self.variable(variable)]
+        if isinstance(codes, str):
+            return mapping[codes]
+        return [mapping[c] for c in codes]
+
+    def code(self, variable, texts):
+        """Code of a value text, or list of codes of a list of texts."""
+        mapping = self.text_to_code[self.variable(variable)]
+        if isinstance(texts, str):
+            return mapping[texts]
+        return [mapping[t] for t in texts]
+
+
+def bulk_lines_to_dfs(lines, chunksize, sep=';'):
+    """Generator that parses the lines of a BULK (csv) data response into
+    pandas dataframes of at most chunksize rows each.
+
+    The first line is taken as header and the last column holds the data
+    values, which are converted to numbers (non-numeric markers such as
+    '..' become NaN).
     """
-    df = pd.DataFrame({ddict['label']: ddict['value']})
-    dims = {k.lower(): v for k, v in ddict['dimension'].items()}
-    keys = [k for k in dims.keys() if k in codes]
-    vals = [list(dims[k]['category']['label'].values()) for k in keys]
-    if len(vals) == len(keys) > 0:
-        index = pd.MultiIndex.from_product(vals, names=keys)
-        df.set_index(index, inplace=True)
+    reader = csv.reader(lines, delimiter=sep)
+    header = next(reader, None)
+    if header is None:
+        return
+    rows = []
+    for row in reader:
+        if not row:
+            continue
+        rows.append(row)
+        if len(rows) >= chunksize:
+            yield _bulk_rows_to_df(rows, header)
+            rows = []
+    if rows:
+        yield _bulk_rows_to_df(rows, header)
+
+
+def _bulk_rows_to_df(rows, header):
+    """Builds a dataframe from parsed BULK rows with a numeric value column."""
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=header)
+    value_col = header[-1]
+    df[value_col] = pd.to_numeric(
+        df[value_col].str.replace(',', '.', regex=False), errors='coerce')
     return df
 
 
+def expand_variables(variables, info, strict=False):
+    """Returns a copy of a list of variable dictionaries where the value
+    patterns of the API are replaced by the explicit list of values found
+    in the tableinfo() response of the table.
+
+    Supported patterns are '*' (all values), wildcards in codes ('20*',
+    '2019K?'), and comparisons on the order of the values ('>=2015K1',
+    '<2020', or both as in '>=2015K1<=2019K4').
+
+    If strict is True, unknown variable codes and values that match no
+    value of the table raise a StatBankValidationError. Otherwise they
+    are passed through unchanged. Empty values always raise a
+    StatBankValidationError.
+    """
+    valid = {v['id'].lower(): [x['id'] for x in v['values']]
+             for v in info['variables']}
+    expanded = []
+    for d in variables:
+        ids = valid.get(d['code'].lower())
+        if ids is None:
+            if strict:
+                raise StatBankValidationError(
+                    f"Unknown variable {d['code']!r} for table {info.get('id')}, "
+                    f"valid codes are {[v['id'] for v in info['variables']]}.")
+            expanded.append(dict(d, values=list(d['values'])))
+            continue
+        values, seen = [], set()
+        for pattern in d['values']:
+            if not str(pattern):
+                raise StatBankValidationError(
+                    f"Empty value for variable {d['code']!r} in table {info.get('id')}.")
+            matches = _match_values(str(pattern), ids)
+            if not matches and strict:
+                raise StatBankValidationError(
+                    f"Value {pattern!r} matches no value of variable "
+                    f"{d['code']!r} in table {info.get('id')}.")
+            for m in matches or [pattern]:
+                if m not in seen:
+                    seen.add(m)
+                    values.append(m)
+        expanded.append(dict(d, values=values))
+    return expanded
+
+
+_COMPARISON = re.compile(r'(>=|<=|>|<)([^<>=]+)')
+
+
+def _match_values(pattern, ids):
+    """Values of a variable, in table order, matched by a value pattern."""
+    if not pattern:
+        return []
+    if pattern == '*':
+        return list(ids)
+    if pattern in ids:
+        return [pattern]
+    if pattern[0] in '<>':
+        parts = _COMPARISON.findall(pattern)
+        if ''.join(op + v for op, v in parts) != pattern:
+            return []
+        position = {v: n for n, v in enumerate(ids)}
+        lo, hi = 0, len(ids) - 1
+        for op, v in parts:
+            if v not in position:
+                return []
+            n = position[v]
+            if op == '>=':
+                lo = max(lo, n)
+            elif op == '>':
+                lo = max(lo, n + 1)
+            elif op == '<=':
+                hi = min(hi, n)
+            else:
+                hi = min(hi, n - 1)
+        return ids[lo:hi + 1]
+    if '*' in pattern or '?' in pattern:
+        regex = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
+        return [v for v in ids if regex.match(v)]
+    lower = pattern.lower()
+    return [v for v in ids if v.lower() == lower]
+
+
+def count_cells(variables):
+    """Number of data cells selected by a list of expanded variable
+    dictionaries. Variables that are not listed count as a single value.
+    """
+    cells = 1
+    for d in variables:
+        cells *= len(d['values'])
+    return cells
+
+
+def split_variables(variables, max_cells):
+    """Splits a list of expanded variable dictionaries into a list of
+    selections that each select at most max_cells cells.
+
+    The time variable ('Tid') is split first, then the variable with the
+    most values. The order of the values is preserved across the returned
+    selections.
+    """
+    cells = count_cells(variables)
+    splittable = [i for i, d in enumerate(variables) if len(d['values']) > 1]
+    if cells <= max_cells or not splittable:
+        return [variables]
+    tid = [i for i in splittable if variables[i]['code'].lower() == 'tid']
+    if tid:
+        i = tid[0]
+    else:
+        i = max(splittable, key=lambda i: len(variables[i]['values']))
+    values = variables[i]['values']
+    step = max(1, max_cells // (cells // len(values)))
+    parts = []
+    for start in range(0, len(values), step):
+        sub = list(variables)
+        sub[i] = dict(variables[i], values=values[start:start + step])
+        parts.extend(split_variables(sub, max_cells))
+    return parts
+
+
+def merge_datasets(ddicts):
+    """Merges JSON-stat datasets covering disjoint parts of the same
+    selection into a single dataset.
+
+    Category order follows the order in which the categories are first
+    seen, so datasets obtained with split_variables() reassemble into the
+    original order. Cells present in several datasets take the value and
+    status of the last one. The status of the merged dataset is sparse.
+    """
+    import numpy as np
+    first = ddicts[0]
+    ids = first['dimension']['id']
+    labels = {k: {} for k in ids}
+    for dd in ddicts:
+        for k in ids:
+            category = dd['dimension'][k]['category']
+            for code in _category_codes(category):
+                labels[k].setdefault(code, category['label'][code])
+    positions = {k: {code: n for n, code in enumerate(labels[k])} for k in ids}
+    shape = [len(labels[k]) for k in ids]
+    values = np.full(shape, None, dtype=object)
+    has_status = any(dd.get('status') is not None for dd in ddicts)
+    status = np.full(shape, None, dtype=object) if has_status else None
+    for dd in ddicts:
+        idx = np.ix_(*[[positions[k][code] for code in
+                        _category_codes(dd['dimension'][k]['category'])]
+                       for k in ids])
+        size = dd['dimension']['size']
+        n = int(np.prod(size, dtype=np.int64))
+        chunk = np.full(n, None, dtype=object)
+        if isinstance(dd['value'], dict):
+            for k, v in dd['value'].items():
+                chunk[int(k)] = v
+        else:
+            chunk[:] = dd['value']
+        values[idx] = chunk.reshape(size)
+        if has_status:
+            part = dd.get('status')
+            status[idx] = (_dense_status(part, n) if part is not None
+                           else np.full(n, None, dtype=object)).reshape(size)
+    merged = dict(first)
+    merged.pop('status', None)
+    if has_status:
+        merged['status'] = {str(n): v for n, v in enumerate(status.ravel())
+                            if v is not None}
+    dimension = dict(first['dimension'])
+    for k in ids:
+        category = dict(first['dimension'][k]['category'])
+        category['index'] = positions[k]
+        category['label'] = labels[k]
+        for dd in ddicts[1:]:
+            if 'unit' in dd['dimension'][k]['category']:
+                category.setdefault('unit', {}).update(
+                    dd['dimension'][k]['category']['unit'])
+        dimension[k] = dict(first['dimension'][k], category=category)
+    dimension['size'] = [len(labels[k]) for k in ids]
+    merged['dimension'] = dimension
+    merged['value'] = values.ravel().tolist()
+    return merged
+
+
+def _category_codes(category):
+    """Category codes of a JSON-stat dimension ordered by their index."""
+    index = category['index']
+    if isinstance(index, list):
+        return list(index)
+    return sorted(index, key=index.get)
+
+
 def add_list_to_dict(d, **kwargs):
     """Adds keyword arguments whose values are lists to a given dictionary."""
     for k, v in kwargs.items():
@@ -26,16 +633,74 @@ def add_list_to_dict(d, **kwargs):
 
 
 def subtabtree(d):
-    """Generator to print tree structure of subjects and tables in db."""
-    for k, v in d.items():
-        if k == 'id':
-            ival = d[k]
-        if k == 'description' or k == 'text':
-            dval = d[k]
-            v = (ival, dval)
-            yield f'\t |--{v}'
-        if isinstance(v, list) and len(v) > 0:
-            for i in v:
-                if isinstance(i, dict):
-                    for g in subtabtree(i):
-                        yield f'\t |  {g}'
+    """Generator to print tree structure of subjects and tables in db.
+
+    The tree is walked iteratively with an explicit stack, and the indent of
+    each line is built once from its depth.
+    """
+    stack = [(d, 0)]
+    while stack:
+        node, depth = stack.pop()
+        ival = node.get('id')
+        children = []
+        for k, v in node.items():
+            if k == 'description' or k == 'text':
+                yield '\t |  ' * depth + f'\t |--{(ival, v)}'
+            if isinstance(v, list):
+                children.extend(i for i in v if isinstance(i, dict))
+        stack.extend((c, depth + 1) for c in reversed(children))
+
+
+def retry_delay(attempt, backoff_factor, max_backoff, retry_after=None):
+    """Seconds to wait before retrying a request.
+
+    Uses exponential backoff with full jitter, unless the server sent a
+    Retry-After header (in seconds or as an HTTP date), which is respected
+    up to max_backoff.
+    """
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(retry_after)
+                delay = (when - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0), max_backoff)
+    return random.uniform(0, min(max_backoff, backoff_factor * 2 ** attempt))
+
+
+def error_message(content):
+    """Extracts the error message from an API error response body."""
+    try:
+        return json.loads(content)['message']
+    except (ValueError, KeyError, TypeError):
+        return content[:200].decode('utf-8', errors='replace')
+
+
+def canonical_variables(variables):
+    """Returns variables ordered by lower-cased code, so that selections
+    that only differ in the order of their variables compare equal."""
+    return sorted(variables or [], key=lambda d: d['code'].lower())
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls to wait() evenly so that at
+    most rate calls are let through per second.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,23 @@
+import pytest
+from denstatbank.denstatbank import StatBankClient
+from .fake_statbank import FakeStatBank
+
+
+@pytest.fixture
+def fake():
+    """Fake StatBank serving BEF5. Override it to serve other tables."""
+    return FakeStatBank()
+
+
+@pytest.fixture
+def client_options():
+    """Keyword arguments of the client fixture. Override it per module."""
+    return {}
+
+
+@pytest.fixture
+def client(fake, client_options, monkeypatch):
+    """StatBankClient whose requests are answered by the fake fixture."""
+    client = StatBankClient(**client_options)
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    return client
@@ -0,0 +1,148 @@
+"""Deterministic in-memory stand-in for the StatBank API used by the tests.
+
+Responses are generated from small synthetic table definitions so that
+requests for overlapping or partial selections can be checked against
+each other. Every cell value is a function of its coordinates only.
+"""
+import copy
+
+
+BEF5 = {
+    'id': 'BEF5',
+    'text': {'en': 'Population 1. January', 'da': 'Folketal 1. januar'},
+    'unit': 'number',
+    'updated': '2020-02-11T08:00:00',
+    'variables': [
+        {'id': 'KØN', 'text': {'en': 'sex', 'da': 'køn'}, 'elimination': True,
+         'time': False,
+         'values': [('M', {'en': 'Men', 'da': 'Mænd'}),
+                    ('K', {'en': 'Women', 'da': 'Kvinder'})]},
+        {'id': 'ALDER', 'text': {'en': 'age', 'da': 'alder'}, 'elimination': True,
+         'time': False,
+         'values': [(str(i), {'en': f'{i} years', 'da': f'{i} år'}) for i in range(5)]},
+        {'id': 'Tid', 'text': {'en': 'time', 'da': 'tid'}, 'elimination': False,
+         'time': True,
+         'values': [(str(y), {'en': str(y), 'da': str(y)}) for y in range(2015, 2020)]},
+    ],
+}
+
+
+def cell_value(positions):
+    """Value of the cell at the given (absolute) value positions."""
+    return 1 + sum(p * 10 ** k for k, p in enumerate(reversed(positions)))
+
+
+class FakeStatBank:
+    """Answers subjects/tables/tableinfo/data requests for synthetic tables.
+
+    Use as a replacement for StatBankClient._base_request with
+    ``monkeypatch.setattr(client, '_base_request', fake.bind(client))``.
+    """
+
+    def __init__(self, tables=None):
+        self.tables_ = {t['id']: copy.deepcopy(t) for t in (tables or [BEF5])}
+        self.calls = []
+
+    def bind(self, client):
+        """Returns a _base_request replacement answering in client.lang."""
+        def _base_request(cat, params, values_array=False):
+            params.setdefault('lang', client.lang)
+            return self.handle(cat, params)
+        return _base_request
+
+    def handle(self, cat, params):
+        params = dict(params)
+        lang = params.setdefault('lang', 'da')
+        self.calls.append((cat, params))
+        if cat == 'tables':
+            return self.tables(lang)
+        if cat == 'tableinfo':
+            return self.tableinfo(params['table'], lang)
+        if cat == 'data':
+            return self.data(params['table'], params.get('variables'), lang)
+        if cat == 'subjects':
+            return self.subjects(lang)
+        raise ValueError(cat)
+
+    def count(self, cat):
+        return len([c for c, _ in self.calls if c == cat])
+
+    def _table(self, table_id):
+        return self.tables_[table_id.upper()]
+
+    def tables(self, lang='da'):
+        return [{'id': t['id'], 'text': t['text'][lang], 'unit': t['unit'],
+                 'updated': t['updated'],
+                 'firstPeriod': t['variables'][-1]['values'][0][0],
+                 'latestPeriod': t['variables'][-1]['values'][-1][0],
+                 'active': True,
+                 'variables': [v['text'][lang] for v in t['variables']]}
+                for t in self.tables_.values()]
+
+    def subjects(self, lang='da'):
+        return [{'id': '02', 'description': 'Population', 'active': True,
+                 'hasSubjects': False, 'subjects': [],
+                 'tables': [{'id': t['id'], 'text': t['text'][lang]}
+                            for t in self.tables_.values()]}]
+
+    def tableinfo(self, table_id, lang='da'):
+        t = self._table(table_id)
+        return {'id': t['id'], 'text': t['text'][lang],
+                'description': t['text'][lang], 'unit': t['unit'],
+                'suppressedDataValue': '0', 'updated': t['updated'],
+                'active': True, 'footnote': None,
+                'variables': [{'id': v['id'], 'text': v['text'][lang],
+                               'elimination': v['elimination'], 'time': v['time'],
+                               'values': [{'id': i, 'text': txt[lang]}
+                                          for i, txt in v['values']]}
+                              for v in t['variables']]}
+
+    @staticmethod
+    def _contents(t):
+        """The ContentsCode dimension of data responses, which is not a
+        variable of tableinfo() and is labelled 'Indhold' in both
+        languages."""
+        return {'id': 'ContentsCode', 'text': {'en': 'Indhold', 'da': 'Indhold'},
+                'values': [(t['id'], t['text'])]}
+
+    def data(self, table_id, variables=None, lang='da'):
+        t = self._table(table_id)
+        selected = {d['code'].lower(): d['values'] for d in (variables or [])}
+        dims, positions = [], []
+        for v in t['variables']:
+            ids = [i for i, _ in v['values']]
+            values = selected.get(v['id'].lower())
+            if values is None:
+                if v['elimination']:
+                    continue
+                values = ids[-1:]
+            if '*' in values:
+                values = ids
+            if v['time']:
+                # Like the API, the contents dimension precedes time.
+                dims.append((self._contents(t), [t['id']]))
+                positions.append([0])
+            dims.append((v, values))
+            positions.append([ids.index(x) for x in values])
+        dimension = {}
+        for v, values in dims:
+            labels = dict(v['values'])
+            dimension[v['id']] = {
+                'label': v['text'][lang],
+                'category': {'index': {x: n for n, x in enumerate(values)},
+                             'label': {x: labels[x][lang] for x in values}}}
+        cells = [[]]
+        for pos in positions:
+            cells = [c + [p] for c in cells for p in pos]
+        ids = [v['id'] for v, _ in dims]
+        dimension.update({'id': ids, 'size': [len(values) for _, values in dims],
+                          'role': {'metric': ['ContentsCode'], 'time': ['Tid']}})
+        by, and_ = (' by ', ' and ') if lang == 'en' else (' efter ', ' og ')
+        texts = [v['text'][lang] for v, _ in dims]
+        label = t['text'][lang] + by + (
+            ', '.join(texts[:-1]) + and_ + texts[-1] if len(texts) > 1 else texts[0])
+        return {'dataset': {'dimension': dimension,
+                            'label': label,
+                            'source': 'Statistics Denmark',
+                            'updated': t['updated'] + 'Z',
+                            'value': [cell_value(c) for c in cells]}}
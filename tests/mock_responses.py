@@ -61,12 +61,6 @@ mock_tableinfo_resp = {'id': 'FOLK1A',
                                                  {'id': '2', 'text': 'Women'}]}]}
 
 
-mock_tableinfo_variable_resp = {'id': ['000', '1', '32', 'U', '2008K4'],
-                                'text': ['All  Denmark', 'Men', '32 years', 'Never married', '2008Q4'],
-                                'variable': ['region', 'sex', 'age', 'marital status', 'time']
-                                }
-
-
 mock_data_resp = {'dataset': {'dimension': {'ContentsCode': {'label': 'Indhold',
                                                              'category': {'index': {'FOLK1A': 0},
                                                                           'label': {'FOLK1A': 'Population at the first day of the quarter'},
@@ -109,3 +103,10 @@ mock_data_resp_with_vars = {'dimension': {'KØN': {'label': 'sex',
 
 
 mock_codes = ['køn', 'tid', 'fodland']
+
+
+mock_bulk_lines = ['KØN;TID;INDHOLD',
+                   'Mænd;2018;2876473',
+                   'Kvinder;2018;2904717',
+                   'Mænd;2019;2889000',
+                   'Kvinder;2019;..']
@@ -0,0 +1,55 @@
+"""Local stand-in HTTP server for the StatBank API.
+
+Requests to ``<base_url><cat>`` are answered by a handler function
+``handler(cat, params)`` returning either a JSON serializable object or
+the response body as bytes. Returning a ``(status, body)`` tuple sends an
+error status.
+"""
+import contextlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        params = json.loads(self.rfile.read(length) or b'{}')
+        cat = unquote(self.path.rstrip('/').rsplit('/', 1)[-1])
+        status = 200
+        try:
+            body = self.server.handler(cat, params)
+        except KeyError as ex:
+            status, body = 400, {'message': f'Unknown {ex}'}
+        if isinstance(body, tuple):
+            status, body = body
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve(handler):
+    """Runs a stand-in server in a background thread and yields its base
+    url, e.g. ``StatBankClient(base_url=url)``."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _RequestHandler)
+    server.daemon_threads = True
+    server.handler = handler
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/v1/'
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,62 @@
+import asyncio
+import pandas as pd
+import pytest
+from denstatbank.denstatbank import StatBankClient
+from .fake_statbank import FakeStatBank
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from denstatbank.aio import AsyncStatBankClient  # noqa: E402
+
+
+async def serve(fake):
+    """Starts a local aiohttp server answering from a FakeStatBank."""
+    async def handler(request):
+        params = await request.json()
+        return web.json_response(fake.handle(request.match_info['cat'], params))
+    app = web.Application()
+    app.router.add_post('/v1/{cat}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/v1/'
+
+
+def run(coro_fn):
+    fake = FakeStatBank()
+
+    async def main():
+        runner, url = await serve(fake)
+        try:
+            async with AsyncStatBankClient(max_concurrency=2, base_url=url) as sbc:
+                return await coro_fn(sbc)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main()), fake
+
+
+def test_async_tables_and_tableinfo():
+    async def go(sbc):
+        return await asyncio.gather(sbc.tables(), sbc.tableinfo('bef5'),
+                                    sbc.tableinfo('bef5', variables_df=True))
+    (tdf, info, vdf), fake = run(go)
+    assert isinstance(tdf, pd.DataFrame)
+    assert tdf['id'].tolist() == ['BEF5']
+    assert info['id'] == 'BEF5'
+    assert isinstance(vdf, pd.DataFrame)
+
+
+def test_async_data_matches_sync_conversion():
+    variables = [StatBankClient.variable_dict('KØN', ['*']),
+                 StatBankClient.variable_dict('Tid', ['*'])]
+
+    async def go(sbc):
+        return await asyncio.gather(
+            sbc.data('bef5', variables=variables),
+            sbc.data('bef5', variables=variables, max_cells=4))
+    (df, split_df), fake = run(go)
+    assert df.shape == (10, 1)
+    pd.testing.assert_frame_equal(df, split_df)
+    assert fake.count('data') == 1 + 3
@@ -0,0 +1,77 @@
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+from denstatbank.align import Aligner
+from .fake_statbank import FakeStatBank, BEF5
+
+INDK = {
+    'id': 'INDK',
+    'text': {'en': 'Income', 'da': 'Indkomst'},
+    'unit': 'kr.',
+    'updated': '2021-01-01T08:00:00',
+    'variables': [
+        {'id': 'KØN', 'text': {'en': 'gender', 'da': 'køn'}, 'elimination': True,
+         'time': False,
+         'values': [('K', {'en': 'Female', 'da': 'Kvinder i alt'}),
+                    ('M', {'en': 'Male', 'da': 'Mænd i alt'})]},
+        {'id': 'Tid', 'text': {'en': 'time', 'da': 'tid'}, 'elimination': False,
+         'time': True,
+         'values': [(str(y), {'en': str(y), 'da': str(y)}) for y in range(2017, 2022)]},
+    ],
+}
+
+
+@pytest.fixture
+def fake():
+    return FakeStatBank([BEF5, copy.deepcopy(INDK)])
+
+
+def frames(client):
+    kon = client.variable_dict('KØN', ['*'])
+    tid = client.variable_dict('Tid', ['*'])
+    pop = client.data('bef5', variables=[kon, tid])
+    inc = client.data('indk', variables=[kon, tid])
+    return pop, inc
+
+
+def test_join_matches_codes_not_texts(client):
+    pop, inc = frames(client)
+    df = client.join([pop, inc], tables=['bef5', 'indk'])
+    assert df.index.names == ['køn', 'tid']
+    assert df.index.levels[0].tolist() == ['Mænd', 'Kvinder']
+    assert df.index.get_level_values('tid').unique().tolist() == ['2017', '2018', '2019']
+    assert df.shape == (6, 2)
+    expected = pop.xs('2018', level='tid').loc['Kvinder'].iloc[0]
+    assert df.loc[('Kvinder', '2018')].iloc[0] == expected
+    assert df.loc[('Kvinder', '2018')].iloc[1] == inc.loc[('Kvinder i alt', '2018')].iloc[0]
+    assert df.attrs['codes']['køn'] == {'Mænd': 'M', 'Kvinder': 'K'}
+
+
+def test_align_outer_fills_missing_cells(client):
+    pop, inc = frames(client)
+    aligner = Aligner()
+    a, b = aligner.align([pop, inc], how='outer')
+    assert a.index.equals(b.index)
+    assert len(a) == 2 * 7
+    assert np.isnan(a.loc[('Mænd', '2021')].iloc[0])
+    assert np.isnan(b.loc[('Mænd', '2015')].iloc[0])
+    assert b.loc[('Mænd', '2021')].iloc[0] == inc.loc[('Mænd i alt', '2021')].iloc[0]
+    keys = aligner.level_keys(pop, 'køn')
+    assert aligner.level_keys(pop, 'køn') is keys
+
+
+def test_align_rejects_unaligned_levels(client):
+    pop, inc = frames(client)
+    alder = client.variable_dict('ALDER', ['0', '1'])
+    by_age = client.data('bef5', variables=[alder, client.variable_dict('Tid', ['2018'])])
+    with pytest.raises(ValueError):
+        client.join([by_age, inc])
+    with pytest.raises(ValueError):
+        client.join([pop, inc], on=['alder'])
+    one_age = client.data('bef5', variables=[client.variable_dict('ALDER', ['0']),
+                                             client.variable_dict('KØN', ['M']),
+                                             client.variable_dict('Tid', ['*'])])
+    joined = client.join([one_age, inc])
+    assert isinstance(joined, pd.DataFrame)
+    assert joined.index.names == ['køn', 'tid'] and len(joined) == 3
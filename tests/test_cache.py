@@ -0,0 +1,159 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from denstatbank.denstatbank import StatBankClient
+from denstatbank.cache import MetadataCache, ResponseCache
+
+
+@pytest.fixture
+def client_options(tmp_path):
+    return {'cache': tmp_path}
+
+
+def test_tableinfo_is_cached(client, fake, tmp_path):
+    info = client.tableinfo('bef5')
+    assert client.tableinfo('BEF5') == info
+    assert fake.count('tableinfo') == 1
+    client.lang = 'en'
+    assert client.tableinfo('bef5')['text'] == 'Population 1. January'
+    assert fake.count('tableinfo') == 2
+    # entries persist across clients
+    other = StatBankClient(cache=tmp_path / 'metadata.sqlite')
+    other._base_request = fake.bind(other)
+    assert other.tableinfo('bef5') == info
+    assert fake.count('tableinfo') == 2
+
+
+def test_subjects_are_cached(client, fake):
+    r = client.subjects(as_tree=False, include_tables=True)
+    assert client.subjects(as_tree=False, include_tables=True) == r
+    client.subjects(as_tree=False)
+    assert fake.count('subjects') == 2
+
+
+def test_refresh_cache_drops_updated_tables(client, fake):
+    client.tableinfo('bef5')
+    client.subjects(as_tree=False)
+    assert client.refresh_cache(past_days=1) == 0
+    fake.tables_['BEF5']['updated'] = '2020-05-11T08:00:00'
+    assert client.refresh_cache(past_days=1) == 1
+    client.tableinfo('bef5')
+    client.subjects(as_tree=False)
+    assert fake.count('tableinfo') == 2
+    assert fake.count('subjects') == 1
+
+
+def test_refresh_drops_entries_outside_window(tmp_path):
+    cache = MetadataCache(tmp_path / 'meta.sqlite')
+    cache.put('tableinfo', 'BEF5', 'da', {'id': 'BEF5'}, '2020-02-11T08:00:00')
+    assert cache.refresh([], past_days=0) == 1
+    assert cache.get('tableinfo', 'BEF5', 'da') is None
+
+
+def test_cache_creates_missing_directories(tmp_path):
+    cache = MetadataCache(tmp_path / 'cache' / 'denstatbank')
+    assert cache.path == str(tmp_path / 'cache' / 'denstatbank' / 'metadata.sqlite')
+    cache = MetadataCache(tmp_path / 'other' / 'meta.sqlite')
+    cache.put('tableinfo', 'BEF5', 'da', {'id': 'BEF5'})
+    assert (tmp_path / 'other' / 'meta.sqlite').is_file()
+
+
+def test_data_incremental_fetches_only_new_periods(client, fake):
+    kon = client.variable_dict('KØN', ['*'])
+    df = client.data_incremental('bef5', variables=[kon])
+    assert df.shape == (10, 1)
+    assert fake.count('data') == 1
+    # unchanged table: served from the cache after one tables() request
+    pd.testing.assert_frame_equal(client.data_incremental('bef5', variables=[kon]), df)
+    assert fake.count('data') == 1
+    assert fake.count('tables') == 2
+
+    tid = fake.tables_['BEF5']['variables'][-1]
+    tid['values'].append(('2020', {'en': '2020', 'da': '2020'}))
+    fake.tables_['BEF5']['updated'] = '2021-02-11T08:00:00'
+    df = client.data_incremental('bef5', variables=[kon], revisions=1)
+    assert df.shape == (12, 1)
+    cat, params = fake.calls[-1]
+    assert cat == 'data'
+    assert params['variables'][-1]['values'] == ['2019', '2020']
+    expected = client.data('bef5', variables=[kon, client.variable_dict('Tid', ['*'])])
+    pd.testing.assert_frame_equal(df, expected)
+    options = dict(parse_time=True, compact=True)
+    df = client.data_incremental('bef5', variables=[kon], **options)
+    expected = client.data('bef5', variables=[kon, client.variable_dict('Tid', ['*'])],
+                           **options)
+    pd.testing.assert_frame_equal(df, expected)
+    assert isinstance(df.index.levels[1], pd.PeriodIndex)
+    assert 'parse_time' not in fake.calls[-1][1]
+
+
+def test_data_incremental_requires_cache(monkeypatch):
+    with pytest.raises(ValueError):
+        StatBankClient().data_incremental('bef5')
+
+
+def test_response_cache_key_is_canonical():
+    tid = {'code': 'Tid', 'values': ['2018']}
+    kon = {'code': 'KØN', 'values': ['M']}
+    key = ResponseCache.key('data', {'table': 'bef5', 'variables': [tid, kon],
+                                     'lang': 'da'})
+    assert key == ResponseCache.key('data', {'lang': 'da', 'table': 'BEF5',
+                                             'variables': [kon, tid]})
+    assert key != ResponseCache.key('data', {'table': 'bef5', 'variables': [tid, kon],
+                                             'lang': 'en'})
+
+
+def test_response_cache_evicts_lru_and_expired(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('denstatbank.cache.time.monotonic', lambda: now[0])
+    cache = ResponseCache(max_bytes=10, ttl={'tables': 5, 'data': 0})
+    cache.put('a', 'tables', b'aaaa')
+    cache.put('b', 'tables', b'bbbb')
+    assert cache.get('a') == b'aaaa'
+    cache.put('c', 'tables', b'cccc')
+    assert cache.get('b') is None
+    assert cache.nbytes == 8
+    cache.put('d', 'data', b'd')
+    assert cache.get('d') is None
+    now[0] = 6
+    assert cache.get('a') is None
+    assert len(cache) == 1
+
+
+def test_response_cache_single_flight():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def send():
+        calls.append(1)
+        release.wait(5)
+        return b'[1]'
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(cache.fetch, 'tables', {'lang': 'da'}, send)
+                   for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        results = [f.result() for f in futures]
+    assert len(calls) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True]
+    assert cache.fetch('tables', {'lang': 'da'}, send) == (b'[1]', True)
+
+
+def test_client_memory_cache_returns_fresh_copies(monkeypatch):
+    client = StatBankClient(decoder='json', memory_cache=True)
+    sent = []
+
+    def mock_post(cat, params, **kwargs):
+        sent.append(cat)
+        return SimpleNamespace(content=b'[{"id": "FOLK1A"}]')
+    monkeypatch.setattr(client, "_post", mock_post)
+    first = client.tables(as_df=False)
+    first[0]['id'] = 'changed'
+    assert client.tables(as_df=False) == [{'id': 'FOLK1A'}]
+    client.lang = 'en'
+    client.tables(as_df=False)
+    assert sent == ['tables', 'tables']
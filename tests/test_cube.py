@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from denstatbank.denstatbank import StatBankClient
+from denstatbank.cube import Cube, CubeStore, _missing_boxes
+from .fake_statbank import FakeStatBank
+
+
+@pytest.fixture
+def client_options():
+    return {'cube_store': True}
+
+
+def selection(client, kon, tid):
+    return [client.variable_dict('KØN', kon), client.variable_dict('Tid', tid)]
+
+
+def data_requests(fake):
+    return [{d['code']: d['values'] for d in p['variables']}
+            for c, p in fake.calls if c == 'data']
+
+
+def test_missing_boxes():
+    box = [['M', 'K'], ['2018', '2019', '2020']]
+    missing = np.array([[False, False, True], [True, True, True]])
+    assert _missing_boxes(box, missing, 0) == [
+        [['K'], ['2018', '2019', '2020']], [['M'], ['2020']]]
+    assert _missing_boxes(box, np.zeros((2, 3), dtype=bool), 0) == []
+    box = [['M', 'K'], ['0', '1'], ['2018', '2019']]
+    missing = np.zeros((2, 2, 2), dtype=bool)
+    missing[0, 1, 1] = missing[1, 0, 0] = True
+    assert _missing_boxes(box, missing, 0) == [box]
+    missing[1, 1, 1] = missing[1, 0, 1] = missing[1, 1, 0] = True
+    assert _missing_boxes(box, missing, 0) == [
+        [['K'], ['0', '1'], ['2018', '2019']], [['M'], ['1'], ['2019']]]
+
+
+def test_cube_fetches_only_missing_slices(client, fake):
+    client.data('bef5', variables=selection(client, ['M'], ['2017', '2018']))
+    df = client.data('bef5', variables=selection(client, ['M', 'K'],
+                                                 ['2017', '2018', '2019']))
+    assert data_requests(fake)[1:] == [{'KØN': ['K'], 'Tid': ['2017', '2018', '2019']},
+                                       {'KØN': ['M'], 'Tid': ['2019']}]
+    direct = StatBankClient()
+    direct._base_request = FakeStatBank().bind(direct)
+    expected = direct.data('bef5', variables=selection(direct, ['M', 'K'],
+                                                       ['2017', '2018', '2019']))
+    assert df.equals(expected)
+    assert df.attrs == expected.attrs
+    client.data('bef5', variables=selection(client, ['K'], ['>=2018']))
+    assert fake.count('data') == 3
+
+
+def test_cube_keeps_selections_of_other_variables_apart(client, fake):
+    client.data('bef5', variables=selection(client, ['M'], ['2018']))
+    df = client.data('bef5', variables=[client.variable_dict('Tid', ['2018'])])
+    assert fake.count('data') == 2
+    assert df.index.names == ['tid']
+    assert len(client.cube_store) == 2
+
+
+def test_cube_is_dropped_when_table_is_updated(client, fake):
+    variables = selection(client, ['M'], ['2018'])
+    client.data('bef5', variables=variables)
+    fake.tables_['BEF5']['updated'] = '2021-02-11T08:00:00'
+    assert client.refresh_cache(past_days=1) == 1
+    client.data('bef5', variables=variables)
+    assert fake.count('data') == 2
+
+
+def test_cube_store_key_and_clear():
+    store = CubeStore()
+    cube = store.cube('bef5', 'da', ['Tid', 'KØN'], updated='a')
+    assert store.cube('BEF5', 'da', ['køn', 'tid'], updated='a') is cube
+    cube.add(FakeStatBank().data('BEF5', [{'code': 'Tid', 'values': ['2018']}])['dataset'])
+    assert len(cube) == 1
+    assert store.cube('bef5', 'da', ['Tid', 'KØN'], updated='b') is cube
+    assert len(cube) == 0 and cube.updated == 'b'
+    assert isinstance(cube, Cube)
@@ -0,0 +1,50 @@
+import json
+import numpy as np
+import pytest
+from denstatbank.decoders import available_decoders, get_decoder
+from denstatbank.utils import data_dict_to_df
+from .mock_responses import mock_data_resp, mock_data_resp_with_vars, mock_codes
+
+
+content = json.dumps({'dataset': mock_data_resp_with_vars}).encode('utf-8')
+
+
+@pytest.mark.parametrize('name', available_decoders())
+def test_decoders_agree(name):
+    decode = get_decoder(name)
+    assert decode(content) == {'dataset': mock_data_resp_with_vars}
+    assert decode(json.dumps(mock_data_resp).encode()) == mock_data_resp
+    ddict = decode(content, values_array=True)['dataset']
+    df = data_dict_to_df(ddict, mock_codes)
+    assert df.iloc[:, 0].tolist() == mock_data_resp_with_vars['value']
+
+
+def test_simdjson_values_array():
+    pytest.importorskip('simdjson')
+    decode = get_decoder('simdjson')
+    ddict = decode(content, values_array=True)['dataset']
+    assert isinstance(ddict['value'], np.ndarray)
+    assert ddict['dimension'] == mock_data_resp_with_vars['dimension']
+    with_null = json.dumps({'dataset': dict(mock_data_resp_with_vars,
+                                            value=[1, None])}).encode()
+    assert decode(with_null, values_array=True)['dataset']['value'] == [1, None]
+
+
+@pytest.mark.parametrize('name', available_decoders())
+def test_decoders_sparse_values_and_status(name):
+    sparse = dict(mock_data_resp_with_vars, value={'0': 7016, '3': 2787},
+                  status={'3': 'p'})
+    body = json.dumps({'dataset': sparse}).encode('utf-8')
+    ddict = get_decoder(name)(body, values_array=True)['dataset']
+    assert ddict['value'] == {'0': 7016, '3': 2787}
+    assert ddict['status'] == {'3': 'p'}
+    df = data_dict_to_df(ddict, mock_codes)
+    assert df.iloc[3, 0] == 2787 and df['status'].iloc[3] == 'p'
+    assert df.iloc[1:3, 0].isna().all()
+
+
+def test_get_decoder_callable_and_errors():
+    decode = get_decoder(json.loads)
+    assert decode(b'[1]', values_array=True) == [1]
+    with pytest.raises(ValueError):
+        get_decoder('yaml')
@@ -1,17 +1,28 @@
 import pandas as pd
 import pytest
+import requests
+from datetime import timedelta
+from types import SimpleNamespace
 from denstatbank.denstatbank import StatBankClient
-from denstatbank.utils import data_dict_to_df, add_list_to_dict
+from denstatbank.utils import (data_dict_to_df, add_list_to_dict, bulk_lines_to_dfs,
+                               expand_variables, count_cells, split_variables,
+                               merge_datasets, parse_periods)
+from denstatbank.utils import retry_delay, RateLimiter, compact_df
+from denstatbank.metrics import InMemoryMetrics
+from denstatbank.exceptions import (StatBankRequestError, StatBankRateLimitError,
+                                    StatBankTimeoutError, StatBankValidationError,
+                                    StatBankCellLimitError)
+from .fake_statbank import FakeStatBank
 from .mock_responses import (
     mock_sub_resp_default,
     mock_sub_resp_2401,
     mock_tables_resp,
     mock_tableinfo_resp,
-    mock_tableinfo_variable_resp,
     mock_data_resp,
     mock_data_resp_to_df,
     mock_data_resp_with_vars,
-    mock_codes
+    mock_codes,
+    mock_bulk_lines
 )
 
 
@@ -21,6 +32,39 @@ def no_requests(monkeypatch):
     monkeypatch.delattr("requests.sessions.Session.request")
 
 
+class MockResponse:
+    """Minimal stand-in for requests.Response."""
+
+    def __init__(self, status_code=200, json_data=None, lines=None, content=b'',
+                 headers=None):
+        self.status_code = status_code
+        self._json = json_data
+        self._lines = lines or []
+        self.content = content
+        self.headers = headers or {}
+        self.encoding = None
+        self.elapsed = timedelta(seconds=0.01)
+        self.request = SimpleNamespace(body=b'{}')
+
+    def json(self):
+        return self._json
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self._lines)
+
+    def iter_content(self, chunk_size=1):
+        return iter([self.content])
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 @pytest.fixture
 def client():
     client = StatBankClient()
@@ -106,17 +150,58 @@ def test_tableinfo_returns_dict(client, monkeypatch):
 
 
 def test_tableinfo_returns_variables_df(client, monkeypatch):
-    def mock_tableinfo(self, table_id, variables_df):
-        if variables_df:
-            return pd.DataFrame(mock_tableinfo_variable_resp)
-    monkeypatch.setattr(StatBankClient, "tableinfo", mock_tableinfo)
+    def mock_base_request(cat, params, values_array=False):
+        return mock_tableinfo_resp
+    monkeypatch.setattr(client, "_base_request", mock_base_request)
     df = client.tableinfo('FOLK1A', variables_df=True)
     assert isinstance(df, pd.DataFrame)
-    print(df)
-    assert 'id' in df.columns
-    assert 'text' in df.columns
-    assert 'variable' in df.columns
-    assert len(df.columns.tolist()) == 3
+    assert df.columns.tolist() == ['text']
+    assert df.index.names == ['variable', 'id']
+    assert df.index.is_unique
+    assert df.loc[('KØN', '1'), 'text'] == 'Men'
+    client.lang = 'en'
+    df = client.tableinfo('FOLK1A', variables_df=True)
+    assert df.loc['sex'].index.tolist() == ['TOT', '1', '2']
+
+
+def test_lookup(client, fake, monkeypatch):
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    da = client.lookup('bef5')
+    en = client.lookup('BEF5', lang='en')
+    assert client.lookup('bef5') is da
+    assert fake.count('tableinfo') == 2
+    assert da.text('køn', 'K') == 'Kvinder'
+    assert en.text('KØN', ['M', 'K']) == ['Men', 'Women']
+    assert en.code('sex', 'Women') == 'K'
+    assert da.code('ALDER', ['0 år']) == ['0']
+    assert en.variable_text['Tid'] == 'time'
+
+
+def test_relabel_matches_other_language(client, fake, monkeypatch):
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    variables = [client.variable_dict('KØN', ['K', 'M']),
+                 client.variable_dict('ALDER', ['0', '3']),
+                 client.variable_dict('Tid', ['2018', '2019'])]
+    da = client.data('bef5', variables=variables)
+    en = client.relabel(da, 'bef5', lang='en')
+    client.lang = 'en'
+    expected = client.data('bef5', variables=variables)
+    assert en.equals(expected)
+    assert en.columns.tolist() == expected.columns.tolist()
+    assert en.attrs['label'] == expected.attrs['label']
+    assert en.attrs['label'] == 'Population 1. January by sex, age, Indhold and time'
+    assert fake.count('data') == 2
+    back = client.relabel(en, 'bef5', lang='da')
+    assert back.equals(da) and back.columns.tolist() == da.columns.tolist()
+    expected_all = client.data('bef5', variables=variables, all_dims=True)
+    client.lang = 'da'
+    all_en = client.relabel(client.data('bef5', variables=variables, all_dims=True),
+                            'bef5', lang='en')
+    assert all_en.equals(expected_all)
+    assert all_en.index.levels[2].tolist() == ['Population 1. January']
+    sliced = da.loc[['Kvinder']].copy()
+    sliced.index = sliced.index.remove_unused_levels()
+    assert client.relabel(sliced, 'bef5', 'en').index.levels[0].tolist() == ['Women']
 
 
 def test_data_returns_dict(client, monkeypatch):
@@ -162,6 +247,44 @@ def test_data_dict_to_df():
     assert isinstance(df, pd.DataFrame)
     assert isinstance(df.index, pd.MultiIndex)
     assert df.shape == (8, 1)
+    assert df.index.names == ['køn', 'fodland', 'tid']
+    assert df.loc[('Women', 'Greenland', '2019')].iloc[0] == 9471
+    assert df.iloc[:, 0].dtype == 'float64'
+
+
+def test_data_dict_to_df_all_dims_and_sparse_values():
+    ddict = dict(mock_data_resp_with_vars,
+                 value={'0': 7016, '7': 2787}, status={'7': 'p'})
+    df = data_dict_to_df(ddict, all_dims=True)
+    assert df.index.names == ['køn', 'fodland', 'contentscode', 'tid']
+    assert df.shape == (8, 2)
+    assert df.iloc[0, 0] == 7016
+    assert df.iloc[7, 0] == 2787
+    assert df.iloc[1:7, 0].isna().all()
+    assert df['status'].isna().sum() == 7
+    assert df['status'].iloc[7] == 'p'
+    assert data_dict_to_df(ddict).index.equals(pd.RangeIndex(8))
+
+
+def test_parse_periods():
+    assert parse_periods(('2020K1', '2020K4')).equals(
+        pd.PeriodIndex(['2020Q1', '2020Q4'], freq='Q'))
+    assert parse_periods(('2019M07',)).equals(pd.PeriodIndex(['2019-07'], freq='M'))
+    assert parse_periods(('2018H2',))[0] == pd.Period('2018-07', freq='6M')
+    assert parse_periods(('2020U53',))[0].start_time == pd.Timestamp('2020-12-28')
+    assert parse_periods(('2017', '2018')).equals(pd.PeriodIndex(['2017', '2018'], freq='Y'))
+    assert parse_periods(('2020M02D29',))[0] == pd.Period('2020-02-29', freq='D')
+    assert parse_periods(('2020K1', '2020M01')) is None
+    assert parse_periods(('2019/2020',)) is None
+    assert parse_periods(('2020K1',)) is parse_periods(('2020K1',))
+
+
+def test_data_dict_to_df_parse_time():
+    df = data_dict_to_df(mock_data_resp_with_vars, mock_codes, parse_time=True)
+    tid = df.index.get_level_values('tid')
+    assert isinstance(tid, pd.PeriodIndex)
+    assert tid.unique().tolist() == [pd.Period('2018', 'Y'), pd.Period('2019', 'Y')]
+    assert df.index.get_level_values('køn').tolist()[:2] == ['Men', 'Men']
 
 
 def test_add_list_to_dict():
@@ -174,3 +297,299 @@ def test_add_list_to_dict():
     with pytest.raises(Exception) as e:
         assert add_list_to_dict(params, subjects='03')
     assert str(e.value) == 'subjects must be a list.'
+
+
+def test_bulk_lines_to_dfs():
+    dfs = list(bulk_lines_to_dfs(iter(mock_bulk_lines), chunksize=3))
+    assert [len(df) for df in dfs] == [3, 1]
+    assert dfs[0].columns.tolist() == ['KØN', 'TID', 'INDHOLD']
+    assert dfs[0]['INDHOLD'].tolist() == [2876473, 2904717, 2889000]
+    assert dfs[1]['INDHOLD'].isna().all()
+    assert list(bulk_lines_to_dfs(iter([]), chunksize=3)) == []
+
+
+def test_data_stream(client, monkeypatch):
+    sent = {}
+
+    def mock_post(url, json=None, stream=False, **kwargs):
+        sent.update(json=json, stream=stream)
+        return MockResponse(lines=mock_bulk_lines)
+    monkeypatch.setattr(client.session, "post", mock_post)
+    dfs = list(client.data_stream('bef5', chunksize=2))
+    assert sent['json']['format'] == 'BULK'
+    assert sent['stream']
+    assert len(dfs) == 2
+    assert pd.concat(dfs).shape == (4, 3)
+
+
+def test_data_to_csv(client, monkeypatch, tmp_path):
+    content = '\n'.join(mock_bulk_lines).encode('utf-8')
+    monkeypatch.setattr(client.session, "post",
+                        lambda url, json=None, **kwargs: MockResponse(content=content))
+    path = client.data_to_csv('bef5', tmp_path / 'bef5.csv')
+    assert path.read_bytes() == content
+
+
+def test_split_variables():
+    fake = FakeStatBank()
+    variables = expand_variables([{'code': 'alder', 'values': ['*']},
+                                  {'code': 'tid', 'values': ['*']},
+                                  {'code': 'KØN', 'values': ['M', 'K']}],
+                                 fake.tableinfo('BEF5'))
+    assert count_cells(variables) == 50
+    parts = split_variables(variables, 20)
+    assert all(count_cells(p) <= 20 for p in parts)
+    assert sum(count_cells(p) for p in parts) == 50
+    assert [v for p in parts for v in p[1]['values']] == [str(y) for y in range(2015, 2020)]
+    parts = split_variables(variables, 4)
+    assert all(count_cells(p) <= 4 for p in parts)
+    assert split_variables(variables, 50) == [variables]
+
+
+def test_merge_datasets():
+    fake = FakeStatBank()
+    full = fake.data('BEF5', [{'code': 'KØN', 'values': ['*']},
+                              {'code': 'Tid', 'values': ['*']}])['dataset']
+    parts = [fake.data('BEF5', [{'code': 'KØN', 'values': ['*']},
+                                {'code': 'Tid', 'values': tid}])['dataset']
+             for tid in (['2015', '2016'], ['2017'], ['2018', '2019'])]
+    merged = merge_datasets(parts)
+    assert merged['value'] == full['value']
+    assert merged['dimension']['size'] == full['dimension']['size']
+    assert merged['dimension']['Tid']['category'] == full['dimension']['Tid']['category']
+    assert 'status' not in merged
+    parts[0]['status'] = ['a', 'b', 'c', 'd']
+    parts[2]['status'] = {'3': 'p'}
+    merged = merge_datasets(parts)
+    assert merged['status'] == {'0': 'a', '1': 'b', '5': 'c', '6': 'd', '9': 'p'}
+    df = data_dict_to_df(merged, ['KØN', 'Tid'])
+    assert df.loc[('Kvinder', '2016'), 'status'] == 'd'
+
+
+def test_data_splits_oversized_selection(client, fake, monkeypatch):
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    variables = [client.variable_dict('KØN', ['*']),
+                 client.variable_dict('ALDER', ['*']),
+                 client.variable_dict('Tid', ['*'])]
+    expected = client.data('BEF5', variables=variables)
+    df = client.data('BEF5', variables=variables, max_cells=15)
+    assert fake.count('data') == 1 + 5
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_data_all_dims(client, fake, monkeypatch):
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    kon = client.variable_dict('KØN', ['*'])
+    assert client.data('BEF5', variables=[kon]).index.names == ['køn']
+    df = client.data('BEF5', variables=[kon], all_dims=True)
+    assert df.index.names == ['køn', 'contentscode', 'tid']
+    assert 'all_dims' not in fake.calls[-1][1]
+
+
+def test_base_request_decodes_content(monkeypatch):
+    client = StatBankClient(decoder='json')
+    content = b'{"dataset": {"label": "x"}}'
+    monkeypatch.setattr(client.session, "post",
+                        lambda url, json=None, **kwargs: MockResponse(content=content))
+    assert client._base_request('data', {}) == {'dataset': {'label': 'x'}}
+
+
+def test_base_request_retries(monkeypatch):
+    client = StatBankClient(decoder='json', retries=3)
+    replies = [MockResponse(503, content=b'{"message": "busy"}',
+                            headers={'Retry-After': '2'}),
+               requests.Timeout('slow'),
+               MockResponse(content=b'[1]')]
+    sent, waits = [], []
+
+    def mock_post(url, json=None, timeout=None, **kwargs):
+        sent.append(timeout)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+    monkeypatch.setattr(client.session, "post", mock_post)
+    monkeypatch.setattr("denstatbank.denstatbank.time.sleep", waits.append)
+    assert client._base_request('tables', {}) == [1]
+    assert sent == [client.timeout] * 3
+    assert waits[0] == 2
+    assert 0 <= waits[1] <= 2 * client.backoff_factor
+
+
+def test_metrics_record_requests_and_retries(monkeypatch):
+    metrics = InMemoryMetrics()
+    client = StatBankClient(decoder='json', retries=3, metrics=metrics)
+    replies = [MockResponse(503, content=b'{"message": "busy"}'),
+               requests.Timeout('slow'),
+               MockResponse(content=b'[1, 2]')]
+
+    def mock_post(url, json=None, timeout=None, **kwargs):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+    monkeypatch.setattr(client.session, "post", mock_post)
+    monkeypatch.setattr("denstatbank.denstatbank.time.sleep", lambda s: None)
+    client._base_request('tables', {})
+    assert metrics.counter('retries', endpoint='tables', reason='503') == 1
+    assert metrics.counter('retries', endpoint='tables', reason='timeout') == 1
+    assert metrics.values('response_bytes', endpoint='tables') == [19, 6]
+    assert metrics.values('server_seconds', endpoint='tables') == [0.01, 0.01]
+    assert len(metrics.values('request_seconds', endpoint='tables')) == 2
+    assert len(metrics.values('decode_seconds', endpoint='tables')) == 1
+    assert sum(metrics.histogram('request_seconds', endpoint='tables').values()) == 2
+
+
+def test_metrics_histogram_buckets_per_measurement():
+    metrics = InMemoryMetrics(buckets={'rows': (10, 100)})
+    for size in (500, 20000, 5000000):
+        metrics.observe('response_bytes', size, endpoint='data')
+    histogram = metrics.histogram('response_bytes', endpoint='data')
+    assert histogram[1024] == 1 and histogram[2 ** 16] == 1 and histogram[2 ** 24] == 1
+    assert histogram[float('inf')] == 0
+    metrics.observe('rows', 50)
+    assert metrics.histogram('rows') == {10: 0, 100: 1, float('inf'): 0}
+    metrics.observe('request_seconds', 0.3)
+    assert metrics.histogram('request_seconds')[0.5] == 1
+
+
+def test_metrics_record_data_cells_and_conversion():
+    metrics = InMemoryMetrics()
+    client = StatBankClient(metrics=metrics)
+    client._base_request = FakeStatBank().bind(client)
+    client.data('bef5', variables=[client.variable_dict('Tid', ['2018', '2019'])])
+    assert metrics.values('response_cells', endpoint='data') == [2]
+    assert metrics.summary()['convert_seconds{method=data}']['count'] == 1
+
+
+def test_base_request_raises_typed_errors(monkeypatch):
+    client = StatBankClient(decoder='json', retries=1)
+    monkeypatch.setattr("denstatbank.denstatbank.time.sleep", lambda s: None)
+    monkeypatch.setattr(client.session, "post", lambda url, **kwargs: MockResponse(
+        400, content='{"message": "Ukendt tabel"}'.encode()))
+    with pytest.raises(StatBankRequestError) as e:
+        client.tableinfo('nope')
+    assert e.value.status_code == 400
+    assert e.value.message == 'Ukendt tabel'
+    monkeypatch.setattr(client.session, "post", lambda url, **kwargs: MockResponse(
+        429, content=b'Too many requests'))
+    with pytest.raises(StatBankRateLimitError):
+        client.tables()
+
+    def timeout(url, **kwargs):
+        raise requests.ConnectTimeout('down')
+    monkeypatch.setattr(client.session, "post", timeout)
+    with pytest.raises(StatBankTimeoutError):
+        client.tables()
+
+
+def test_retry_delay():
+    assert retry_delay(0, 0.5, 30, retry_after='7') == 7
+    assert retry_delay(0, 0.5, 30, retry_after='120') == 30
+    assert retry_delay(0, 0.5, 30, retry_after='Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert all(0 <= retry_delay(3, 0.5, 30) <= 4 for _ in range(20))
+    assert all(retry_delay(10, 0.5, 30) <= 30 for _ in range(20))
+
+
+def test_data_many(client, fake, monkeypatch):
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    kon = client.variable_dict('KØN', ['*'])
+    tid = client.variable_dict('Tid', ['2018', '2019'])
+    requests_ = ['bef5', ('bef5', [kon, tid]), ('BEF5', [tid, kon]), 'nope']
+    results = client.data_many(requests_, max_workers=2)
+    assert fake.count('data') == 3
+    assert results[0].shape == (1, 1)
+    pd.testing.assert_frame_equal(results[1], results[2])
+    assert results[1] is not results[2]
+    assert isinstance(results[3], KeyError)
+    done = dict(client.data_many(requests_, as_completed=True))
+    assert sorted(done) == [0, 1, 2, 3]
+    pd.testing.assert_frame_equal(done[1], results[1])
+
+
+def test_rate_limiter(monkeypatch):
+    clock = {'now': 100.0}
+    waits = []
+    monkeypatch.setattr("denstatbank.utils.time.monotonic", lambda: clock['now'])
+    monkeypatch.setattr("denstatbank.utils.time.sleep", waits.append)
+    limiter = RateLimiter(4)
+    for _ in range(3):
+        limiter.wait()
+    assert waits == [0.25, 0.5]
+
+
+def test_compact_df():
+    tdf = compact_df(pd.DataFrame(mock_tables_resp * 3))
+    assert str(tdf['updated'].dtype).startswith('datetime64')
+    assert tdf['unit'].dtype == 'category'
+    assert tdf['active'].dtype == bool
+    assert isinstance(tdf['variables'][0], list)
+    df = compact_df(data_dict_to_df(mock_data_resp_with_vars, mock_codes))
+    assert df.iloc[:, 0].dtype == 'Int16'
+    assert df.attrs['label'] == mock_data_resp_with_vars['label']
+    halves = compact_df(pd.DataFrame({'x': [0.5, 1.25, None], 'y': [0.1, 0.2, 0.3]}))
+    assert halves['x'].dtype == 'float32'
+    assert halves['y'].dtype == 'float64'
+
+
+def test_client_compact_setting(fake, monkeypatch):
+    client = StatBankClient(compact=True)
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    kon = client.variable_dict('KØN', ['*'])
+    assert client.data('bef5', variables=[kon]).iloc[:, 0].dtype == 'Int8'
+    assert client.data('bef5', variables=[kon], compact=False).iloc[:, 0].dtype == 'float64'
+    assert str(client.tables()['updated'].dtype).startswith('datetime64')
+    assert client.tableinfo('bef5', variables_df=True).index.names == ['variable', 'id']
+
+
+def test_expand_variables_patterns():
+    info = FakeStatBank().tableinfo('BEF5')
+
+    def values(*patterns):
+        return expand_variables([{'code': 'tid', 'values': list(patterns)}], info)[0]['values']
+    assert values('*') == ['2015', '2016', '2017', '2018', '2019']
+    assert values('>=2018') == ['2018', '2019']
+    assert values('>2016<=2018') == ['2017', '2018']
+    assert values('<2016', '2019') == ['2015', '2019']
+    assert values('201?', '2015') == ['2015', '2016', '2017', '2018', '2019']
+    assert values('2030') == ['2030']
+    with pytest.raises(StatBankValidationError):
+        expand_variables([{'code': 'tid', 'values': ['2030']}], info, strict=True)
+    with pytest.raises(StatBankValidationError):
+        expand_variables([{'code': 'region', 'values': ['*']}], info, strict=True)
+    with pytest.raises(StatBankValidationError, match="'tid'"):
+        expand_variables([{'code': 'tid', 'values': ['']}], info)
+
+
+def test_validate_variables(client, fake, monkeypatch):
+    monkeypatch.setattr(client, "_base_request", fake.bind(client))
+    kon = client.variable_dict('køn', ['*'])
+    tid = client.variable_dict('Tid', ['>=2018'])
+    expanded, cells = client.validate_variables('bef5', [kon, tid])
+    assert cells == 4
+    assert expanded[1]['values'] == ['2018', '2019']
+    with pytest.raises(StatBankCellLimitError) as e:
+        client.validate_variables('bef5', [kon, tid], max_cells=3)
+    assert e.value.cells == 4
+    with pytest.raises(StatBankValidationError):
+        client.data('bef5', variables=[client.variable_dict('KØN', ['X'])],
+                    validate=True)
+    assert fake.count('tableinfo') == 1
+    assert fake.count('data') == 0
+    client.data('bef5', variables=[kon, tid], validate=True, max_cells=2)
+    assert fake.count('tableinfo') == 1
+    assert fake.count('data') == 2
+
+
+def test_client_against_local_server(monkeypatch):
+    monkeypatch.undo()  # allow real requests, to the local server only
+    from .statbank_server import serve
+    fake = FakeStatBank()
+    with serve(fake.handle) as url:
+        client = StatBankClient(base_url=url, retries=0)
+        kon = client.variable_dict('KØN', ['*'])
+        df = client.data('bef5', variables=[kon])
+        assert df.shape == (2, 1)
+        with pytest.raises(StatBankRequestError) as e:
+            client.tableinfo('nope')
+        assert e.value.status_code == 400
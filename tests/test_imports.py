@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+# Modules that must only be imported when they are used.
+LAZY_MODULES = ('pandas', 'numpy', 'orjson', 'simdjson', 'pyarrow', 'aiohttp')
+
+# Upper bound in microseconds for importing denstatbank without requests.
+MAX_IMPORT_US = 250000
+
+
+def import_times(code):
+    """Runs code under python -X importtime and returns the cumulative
+    import time in microseconds of each top level module imported."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_does_not_load_optional_modules():
+    times = import_times('import denstatbank; denstatbank.StatBankClient()')
+    loaded = [m for m in LAZY_MODULES if m in times]
+    assert loaded == []
+    assert times['denstatbank'] - times.get('requests', 0) < MAX_IMPORT_US
+
+
+def test_dataframes_load_pandas():
+    times = import_times('from denstatbank.utils import variables_to_df; '
+                         'variables_to_df([], "da")')
+    assert 'pandas' in times
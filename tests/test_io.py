@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+from denstatbank.utils import data_dict_to_df
+from .mock_responses import mock_data_resp_with_vars, mock_codes, mock_tables_resp
+
+pa = pytest.importorskip("pyarrow")
+from denstatbank.io import (df_to_arrow, to_parquet, read_parquet,  # noqa: E402
+                            to_arrow, read_arrow, dataset_to_arrow, arrow_to_df)
+
+
+@pytest.fixture
+def df():
+    return data_dict_to_df(mock_data_resp_with_vars, mock_codes)
+
+
+def test_df_to_arrow_dictionary_encodes_dimensions(df):
+    table = df_to_arrow(df)
+    assert table.column_names == ['køn', 'fodland', 'tid', df.columns[0]]
+    assert pa.types.is_dictionary(table.schema.field('køn').type)
+    assert table.column(df.columns[0]).type == pa.float64()
+
+
+@pytest.mark.parametrize('write, read', [(to_parquet, read_parquet),
+                                         (to_arrow, read_arrow)])
+def test_roundtrip(df, tmp_path, write, read):
+    path = tmp_path / 'bef5'
+    write(df, path)
+    loaded = read(path)
+    pd.testing.assert_frame_equal(loaded, df)
+    assert loaded.attrs['label'] == mock_data_resp_with_vars['label']
+    assert loaded.attrs['units'] == {'BEF5': {'base': 'number', 'decimals': 0}}
+
+
+def test_roundtrip_keeps_index_type(tmp_path, monkeypatch):
+    single = data_dict_to_df(mock_data_resp_with_vars, ['tid'])
+    assert isinstance(single.index, pd.MultiIndex)
+    to_parquet(single, tmp_path / 'single.parquet')
+    pd.testing.assert_frame_equal(read_parquet(tmp_path / 'single.parquet'), single)
+    plain = pd.DataFrame({'x': [1.0, 2.0]}, index=pd.Index(['a', 'b'], name='k'))
+    to_parquet(plain, tmp_path / 'plain.parquet')
+    assert not isinstance(read_parquet(tmp_path / 'plain.parquet').index, pd.MultiIndex)
+    monkeypatch.setattr('denstatbank.io.pa', None)
+    with pytest.raises(ImportError):
+        to_parquet(plain, tmp_path / 'other.parquet')
+
+
+def test_tables_roundtrip(tmp_path):
+    tdf = pd.DataFrame(mock_tables_resp)
+    to_parquet(tdf, tmp_path / 'tables.parquet')
+    loaded = read_parquet(tmp_path / 'tables.parquet')
+    assert loaded['id'].tolist() == tdf['id'].tolist()
+    assert list(loaded['variables'][0]) == tdf['variables'][0]
+
+
+def test_read_arrow_is_memory_mapped(df, tmp_path):
+    to_arrow(df, tmp_path / 'bef5.arrow')
+    before = pa.total_allocated_bytes()
+    table = read_arrow(tmp_path / 'bef5.arrow', as_table=True)
+    assert table.num_rows == len(df)
+    assert pa.total_allocated_bytes() == before
+
+
+def test_dataset_to_arrow_matches_dataframe(df):
+    ddict = dict(mock_data_resp_with_vars, status={'7': 'p'})
+    table = dataset_to_arrow(ddict, mock_codes)
+    assert table.column_names == ['køn', 'fodland', 'tid', df.columns[0], 'status']
+    assert pa.types.is_dictionary(table.schema.field('tid').type)
+    assert table.column(df.columns[0]).num_chunks == 1
+    expected = data_dict_to_df(ddict, mock_codes)
+    pd.testing.assert_frame_equal(arrow_to_df(table), expected)
+    assert arrow_to_df(table).attrs == expected.attrs
+
+
+@pytest.fixture
+def client_options():
+    return {'backend': 'arrow'}
+
+
+def test_client_backends(client):
+    kon = client.variable_dict('KØN', ['M', 'K'])
+    table = client.data('bef5', variables=[kon])
+    assert isinstance(table, pa.Table)
+    assert table.column('køn').to_pylist() == ['Mænd', 'Kvinder']
+    assert isinstance(client.tables(), pa.Table)
+    info = client.tableinfo('bef5', variables_df=True)
+    assert info.column_names == ['variable', 'id', 'text']
+    assert isinstance(client.data('bef5', backend='pandas'), pd.DataFrame)
+    assert 'dataset' in client.data('bef5', variables=[kon], backend='raw')
+    with pytest.raises(ValueError):
+        client.tables(backend='numpy')
+
+
+def test_polars_backend(client):
+    pl = pytest.importorskip('polars')
+    kon = client.variable_dict('KØN', ['M', 'K'])
+    df = client.data('bef5', variables=[kon], backend='polars')
+    assert isinstance(df, pl.DataFrame)
+    assert df['køn'].dtype == pl.Categorical
+    assert df['køn'].to_list() == ['Mænd', 'Kvinder']
@@ -0,0 +1,72 @@
+import copy
+import json
+import pytest
+from denstatbank.denstatbank import StatBankClient
+from .fake_statbank import FakeStatBank, BEF5
+from .statbank_server import serve
+
+pytest.importorskip("pyarrow")
+from denstatbank.io import read_parquet  # noqa: E402
+from denstatbank.mirror import Mirror, mirror, read_manifest  # noqa: E402
+from denstatbank.cli import main  # noqa: E402
+
+
+@pytest.fixture
+def fake():
+    other = copy.deepcopy(BEF5)
+    other['id'] = 'BEF5B'
+    return FakeStatBank([BEF5, other])
+
+
+@pytest.fixture
+def url(fake):
+    with serve(lambda cat, params: fake.handle(cat, params)) as url:
+        yield url
+
+
+def test_mirror_writes_files_and_manifest(fake, url, tmp_path):
+    client = StatBankClient(base_url=url, retries=0, rate_limit=100)
+    result = mirror(client, tmp_path, max_workers=2, max_cells=20)
+    assert sorted(result['fetched']) == ['BEF5', 'BEF5B']
+    assert fake.count('tableinfo') == 2
+    entry = read_manifest(tmp_path)['tables']['BEF5']
+    assert entry['updated'] == BEF5['updated'] and entry['cells'] == 50
+    df = read_parquet(tmp_path / entry['data'])
+    assert df.index.names == ['køn', 'alder', 'contentscode', 'tid']
+    assert df.shape == (50, 1)
+    variables = [client.variable_dict(c, ['*']) for c in ['KØN', 'ALDER', 'Tid']]
+    expected = client.data('bef5', variables=variables)
+    assert df.iloc[:, 0].tolist() == expected.iloc[:, 0].tolist()
+    with open(tmp_path / entry['metadata'], encoding='utf-8') as f:
+        assert json.load(f)['id'] == 'BEF5'
+
+
+def test_mirror_skips_current_and_resumes_failed(fake, url, tmp_path):
+    client = StatBankClient(base_url=url, retries=0)
+    handle = fake.handle
+
+    def failing(cat, params):
+        if cat == 'data' and params['table'] == 'BEF5B':
+            return 500, {'message': 'down'}
+        return handle(cat, params)
+    fake.handle = failing
+    first = Mirror(client, tmp_path).run()
+    assert first['fetched'] == ['BEF5'] and list(first['failed']) == ['BEF5B']
+    fake.handle = handle
+    data_calls = fake.count('data')
+    second = Mirror(client, tmp_path).run()
+    assert second == {'fetched': ['BEF5B'], 'skipped': ['BEF5'], 'failed': {}}
+    assert fake.count('data') == data_calls + 1
+    fake.tables_['BEF5']['updated'] = '2021-02-11T08:00:00'
+    tableinfo_calls = fake.count('tableinfo')
+    third = Mirror(client, tmp_path).run(tables=['bef5'])
+    assert third['fetched'] == ['BEF5']
+    assert fake.count('tableinfo') == tableinfo_calls + 1
+
+
+def test_mirror_command(fake, url, tmp_path, capsys):
+    code = main(['mirror', str(tmp_path), '--base-url', url, '--tables', 'BEF5',
+                 '--format', 'arrow', '--quiet'])
+    assert code == 0
+    assert capsys.readouterr().out.strip() == '1 fetched, 0 skipped, 0 failed'
+    assert read_manifest(tmp_path)['tables']['BEF5']['data'].endswith('.arrow')
@@ -0,0 +1,67 @@
+from denstatbank.search import TableIndex, subject_paths, stem, tokenize, index_terms
+from .mock_responses import mock_tables_resp
+
+
+subjects = [{'id': '02', 'description': 'Population and elections',
+             'subjects': [{'id': '2401', 'description': 'Population in Denmark',
+                           'subjects': [],
+                           'tables': [{'id': 'FOLK1A', 'text': 'Population'}]}],
+             'tables': []},
+            {'id': '19', 'description': 'Other', 'subjects': [],
+             'tables': [{'id': 'FOLK1B', 'text': 'Population'}]}]
+
+
+class MockClient:
+    lang = 'en'
+
+    def __init__(self):
+        self.tables_ = [dict(t) for t in mock_tables_resp]
+
+    def tables(self, past_days=None, include_inactive=False, as_df=True):
+        return self.tables_[-1:] if past_days else self.tables_
+
+    def subjects(self, **kwargs):
+        return subjects
+
+
+def test_tokenize_and_stem():
+    assert tokenize('Befolkningen, 1. kvartal') == ['befolk', '1', 'kvartal']
+    assert stem('regions') == stem('region')
+    assert stem('kommunerne') == stem('kommune')
+    assert stem('countries') == stem('country')
+    assert index_terms('Befolkningen') == {'befolkningen', 'befolk'}
+
+
+def test_search_matches_partly_typed_words():
+    index = TableIndex({'FOLK1A': {'id': 'FOLK1A', 'text': 'Befolkningen den 1. i kvartalet',
+                                   'variables': ['countries']}})
+    for query in ('befolk', 'befolkn', 'befolkni', 'befolkning', 'befolkninge',
+                  'befolkningen', 'kvartal', 'kvartaler', 'count', 'country', 'countries'):
+        assert [h['id'] for h in index.search(query)] == ['FOLK1A'], query
+    assert index.search('befolkningerx') == []
+
+
+def test_subject_paths():
+    paths = subject_paths(subjects)
+    assert paths['FOLK1A'] == ['Population and elections', 'Population in Denmark']
+    assert paths['FOLK1B'] == ['Other']
+
+
+def test_build_search_and_persist(tmp_path):
+    client = MockClient()
+    index = TableIndex.build(client)
+    hits = index.search('marital popul')
+    assert [h['id'] for h in hits] == ['FOLK1A']
+    assert hits[0]['subjects'][-1] == 'Population in Denmark'
+    assert [h['id'] for h in index.search('folk1')] == ['FOLK1A', 'FOLK1B']
+    assert [h['id'] for h in index.search('citizen elections')] == []
+    assert index.search('') == []
+
+    index.save(tmp_path / 'index.json')
+    loaded = TableIndex.load(tmp_path / 'index.json')
+    assert loaded.search('marital popul') == hits
+
+    client.tables_[-1]['text'] = 'Immigrants at the first day of the quarter'
+    assert loaded.update(client, past_days=1) == 1
+    assert [h['id'] for h in loaded.search('immigrant')] == ['FOLK1B']
+    assert loaded.search('immigrant')[0]['subjects'] == ['Other']
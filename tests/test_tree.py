@@ -0,0 +1,43 @@
+import copy
+from denstatbank.denstatbank import StatBankClient
+from denstatbank.tree import SubjectTree
+from denstatbank.utils import subtabtree
+from .mock_responses import mock_sub_resp_default, mock_sub_resp_2401
+
+
+recursive_resp = [{'id': '02', 'description': 'Population and elections',
+                   'hasSubjects': True,
+                   'subjects': copy.deepcopy(mock_sub_resp_2401), 'tables': []}]
+recursive_resp[0]['subjects'][0]['subjects'][0]['tables'] = [
+    {'id': 'FOLK1A', 'text': 'Population at the first day of the quarter'}]
+
+
+def test_tree_from_recursive_response():
+    tree = SubjectTree.from_response(recursive_resp)
+    assert [n.id for n in tree.path('FOLK1A')] == ['02', '2401', '10021']
+    assert tree['FOLK1A'].is_table
+    assert [n.id for n in tree.tables()] == ['FOLK1A']
+    assert tree.path('NOPE') is None
+    assert list(tree.lines()) == list(subtabtree(recursive_resp[0]))
+
+
+def test_lazy_expansion(monkeypatch):
+    client = StatBankClient()
+    calls = []
+
+    def mock_subjects(subjects=None, include_tables=False, recursive=False, as_tree=True):
+        calls.append((subjects, recursive))
+        if subjects is None:
+            return mock_sub_resp_default
+        return [dict(mock_sub_resp_2401[0], id=subjects[0])]
+    monkeypatch.setattr(client, "subjects", mock_subjects)
+    tree = client.subject_tree()
+    assert calls == [(None, False)]
+    assert [n.id for n in tree.root.children] == ['02', '05']
+    assert not tree['02'].expanded
+    children = tree.expand('02')
+    assert [n.id for n in children] == ['10021', '10022']
+    tree.expand('02')
+    assert calls == [(None, False), (['02'], False)]
+    assert [n.id for n in tree.path('10022')] == ['02']
+    assert [n.id for d, n in tree.walk()] == ['02', '10021', '10022', '05']